@@ -2,29 +2,43 @@ from __future__ import print_function
 
 import base64
 import functools
+import httplib2
+import json
+import orjson
 import os
 import pickle
+import random
 import re
 import requests
 import shutil
 import socket
 import sys
+import tarfile
+import threading
 import time
+import zipfile
 from datetime import datetime
+from datetime import timedelta
 from datetime import timezone
 from email.mime.multipart import MIMEMultipart
 from email.mime.text import MIMEText
 from email.utils import formataddr
+from google.auth.exceptions import RefreshError
 from google.auth.exceptions import TransportError
 from google.auth.transport.requests import Request
+from google.oauth2.credentials import Credentials
+from google_auth_httplib2 import AuthorizedHttp
 from google_auth_oauthlib.flow import InstalledAppFlow
 from googleapiclient.discovery import build
 from googleapiclient.errors import HttpError
+from googleapiclient.model import JsonModel
 from typing import Any
 from typing import Callable
 from typing import Dict
 from typing import List
 from typing import Optional
+from typing import Tuple
+from typing import Union
 
 from definitions import DATE_FORMAT
 from definitions import ROOT_PATH
@@ -34,11 +48,73 @@ from utils.data_models import Submission
 
 logger = get_logger(__name__)
 
+# Max number of requests in one batch HTTP request
+BATCH_MAX_SIZE = 50
+
+# Max number of messages which can be modified with one request
+BATCH_MODIFY_MAX_SIZE = 1000
+
+# Time in seconds before token expiry when the token should be refreshed
+TOKEN_EXPIRY_SKEW = 300
+
+# Timeout of HTTP connections in seconds
+HTTP_TIMEOUT = 30
+
+# Errors of API calls which are repeated
+REPEATED_ERRORS = (ConnectionError, TransportError, RefreshError, HttpError,
+                   requests.ConnectionError, socket.timeout)
+
+# Size of base64 encoded slices that are decoded at once (multiple of 4)
+B64_CHUNK_SIZE = 64 * 1024
+
+# Parts of a message which are needed to parse a submission
+MESSAGE_FIELDS = 'id,internalDate,payload(headers,parts(filename,body))'
+
+# Extensions of archives which are unpacked after downloading
+ZIP_EXTENSIONS = ('.zip',)
+TAR_EXTENSIONS = ('.tar', '.tar.gz', '.tgz', '.tar.bz2', '.tbz2',
+                  '.tar.xz', '.txz')
+
+# Start of Unix time
+UTC_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+# Patterns to parse message headers
+SENDER_REGEX = re.compile(r'.*<(?P<email>.*)>.*')
+SUBJECT_REGEX = re.compile(r'^(?P<label>.*)/(?P<lesson>.*)$')
+
+
+class RateLimiter:
+    """Keep a minimal time gap between consecutive API calls."""
+
+    def __init__(self) -> None:
+        """Create rate limiter."""
+        self._lock = threading.Lock()
+        self._last_call = None
+
+    def acquire(self, min_gap: float) -> None:
+        """Wait until at least `min_gap` seconds passed since the last call.
+
+        :param min_gap: minimal time between calls in seconds.
+        """
+        with self._lock:
+            now = time.monotonic()
+            if self._last_call is not None:
+                time_diff = now - self._last_call
+                if time_diff < min_gap:
+                    time.sleep(min_gap - time_diff)
+                    now = time.monotonic()
+            self._last_call = now
+
+
+_GLOBAL_LIMITER = RateLimiter()
+
 
 def slow_api_calls(func: Optional[Callable] = None, *,
                    min_latency: float = 1) -> Callable:
     """Decorator to prevent exceeding of frequency rate limits of API calls.
 
+    All decorated functions share one rate limiter.
+
     :param func: function to decorate.
     :param min_latency: minimal time of latency between API calls in seconds.
     :return: decorated function.
@@ -48,48 +124,59 @@ def slow_api_calls(func: Optional[Callable] = None, *,
 
     @functools.wraps(func)
     def _wrapper(*args, **kwargs):
-        time_diff = time.time() - _wrapper.last_call
-        if time_diff < min_latency:
-            time.sleep(min_latency - time_diff)
-        _wrapper.last_call = time.time()
+        _GLOBAL_LIMITER.acquire(min_latency)
         return func(*args, **kwargs)
 
-    _wrapper.last_call = time.time()
     return _wrapper
 
 
 def repeat_request(func: Optional[Callable] = None, *,
-                   recreate_resource: bool = True) -> Callable:
+                   recreate_resource: bool = True, max_attempts: int = 6,
+                   base_delay: float = 2, max_delay: float = 60,
+                   max_total: float = 600) -> Callable:
     """Decorator for repeating gmail API calls.
 
-    Intended to overcome connection issues. This will repeat calls with time
-    delay in 1, 5, 10, 15, and 20 minutes.
+    Intended to overcome connection issues. This will repeat calls with
+    truncated exponential backoff and random jitter until the number of
+    attempts or the total time is over.
 
     :param func: function to decorate.
-    :param recreate_resource: if gmail service should be rebuilt.
+    :param recreate_resource: if gmail service should be rebuilt after
+    authorization errors. Other errors are repeated with the same service.
+    :param max_attempts: max number of calls.
+    :param base_delay: delay before the first repeat in seconds.
+    :param max_delay: max delay between calls in seconds.
+    :param max_total: max time of all attempts in seconds.
     :return: decorated function.
     """
     if func is None:
         return functools.partial(repeat_request,
-                                 recreate_resource=recreate_resource)
+                                 recreate_resource=recreate_resource,
+                                 max_attempts=max_attempts,
+                                 base_delay=base_delay, max_delay=max_delay,
+                                 max_total=max_total)
 
     @functools.wraps(func)
     def _wrapper(self, *args, **kwargs):
-        for timeout in [1, 5, 10, 15, 20]:
+        deadline = time.monotonic() + max_total
+        for attempt in range(max_attempts):
             try:
                 return func(self, *args, **kwargs)
-            except (ConnectionError, TransportError, HttpError,
-                    requests.ConnectionError, socket.timeout) as err:
+            except REPEATED_ERRORS as err:
                 error = err
                 exc_type, _, _ = sys.exc_info()
-                sleep_time = timeout * 60
                 logger.debug(f'Failed with {exc_type.__name__}.',
                              exc_info=True)
-                logger.debug(f'Sleep for {sleep_time} seconds.')
+                sleep_time = min(max_delay, base_delay * 2 ** attempt) \
+                    * (0.5 + random.random())
+                if attempt == max_attempts - 1 \
+                        or time.monotonic() + sleep_time > deadline:
+                    break
+                logger.debug(f'Sleep for {sleep_time:.1f} seconds.')
                 time.sleep(sleep_time)
-                if recreate_resource:
+                if recreate_resource and _is_auth_error(err):
                     logger.debug('Recreate Gmail resource.')
-                    self._gmail = self._build_resource()
+                    self._gmail = self._build_resource(force_refresh=True)
                 logger.debug('Request again.')
         logger.warning('The number of attempts is over.')
         raise error
@@ -97,6 +184,32 @@ def repeat_request(func: Optional[Callable] = None, *,
     return _wrapper
 
 
+class OrjsonModel(JsonModel):
+    """JSON model that parses API responses with orjson."""
+
+    def deserialize(self, content: Union[str, bytes]) -> Any:
+        """Parse response body.
+
+        :param content: body of API response.
+        :return: parsed body.
+        """
+        body = orjson.loads(content)
+        if self._data_wrapper and isinstance(body, dict) and 'data' in body:
+            body = body['data']
+        return body
+
+
+def _is_auth_error(error: Exception) -> bool:
+    """Check if the error is caused by invalid credentials.
+
+    :param error: error raised by API call.
+    :return: True if credentials should be refreshed.
+    """
+    if isinstance(error, RefreshError):
+        return True
+    return isinstance(error, HttpError) and error.resp.status == 401
+
+
 class GmailExchanger:
     """Use Gmail API for exchange."""
 
@@ -117,33 +230,44 @@ class GmailExchanger:
         self._fetch_label = fetch_label
         self._send_email = send_email
         self._send_name = send_name
+        self._from_hdr = formataddr((send_name, send_email))
         self._path_downloaded = path_downloaded
         self._path_pickle = os.path.join(
             ROOT_PATH, 'credentials', 'gmail.pickle')
+        self._path_labels = None
         self._scopes = ['https://www.googleapis.com/auth/gmail.modify',
                         'https://www.googleapis.com/auth/gmail.settings.basic']
         self._gmail = None
+        self._creds_cache = None
         self._label_id = None
 
-    @repeat_request(recreate_resource=False)
-    def _build_resource(self) -> Any:
+    @repeat_request(recreate_resource=False, max_attempts=3)
+    def _build_resource(self, force_refresh: bool = False) -> Any:
         """Build gmail api resource.
 
         The first start requires to approve the access of this app to the
         gmail data.
 
+        :param force_refresh: if the token should be refreshed even if it
+        looks valid (e.g., the API rejected it).
         :return: resource for interaction.
         """
-        creds = None
-        if os.path.exists(self._path_pickle):
+        # Reuse the existing resource while the token is fresh
+        creds = self._creds_cache
+        if not force_refresh and self._gmail is not None \
+                and self._is_token_fresh(creds):
+            logger.debug('Gmail resource with valid credentials is reused.')
+            return self._gmail
+
+        if creds is None and os.path.exists(self._path_pickle):
             with open(self._path_pickle, 'rb') as token:
                 creds = pickle.load(token)
         elif not os.path.isdir(os.path.dirname(self._path_pickle)):
             os.makedirs(os.path.dirname(self._path_pickle))
 
-        # If there are no (valid) credentials available, let the user log in
-        if not creds or not creds.valid:
-            if creds and creds.expired and creds.refresh_token:
+        # If there are no fresh credentials available, let the user log in
+        if force_refresh or not self._is_token_fresh(creds):
+            if creds and creds.refresh_token:
                 creds.refresh(Request())
             else:
                 flow = InstalledAppFlow.from_client_config(
@@ -153,10 +277,29 @@ class GmailExchanger:
             # Save the credentials for the next run
             with open(self._path_pickle, 'wb') as token:
                 pickle.dump(creds, token)
-        _gmail = build('gmail', 'v1', credentials=creds)
+        self._creds_cache = creds
+
+        # Reuse one keep-alive connection for all requests of the resource
+        http = AuthorizedHttp(creds, http=httplib2.Http(timeout=HTTP_TIMEOUT))
+        _gmail = build('gmail', 'v1', http=http, model=OrjsonModel(),
+                       cache_discovery=False, static_discovery=True)
         logger.debug('New Gmail resource was created.')
         return _gmail
 
+    @staticmethod
+    def _is_token_fresh(creds: Optional[Credentials]) -> bool:
+        """Check if credentials are valid and will not expire soon.
+
+        :param creds: OAuth2 credentials.
+        :return: True if credentials can be used without refreshing.
+        """
+        if not creds or not creds.valid:
+            return False
+        if creds.expiry is None:
+            return True
+        time_left = creds.expiry - datetime.utcnow()
+        return time_left.total_seconds() > TOKEN_EXPIRY_SKEW
+
     def connect(self, to_create_filter: bool = False,
                 fetch_keyword: Optional[str] = None,
                 fetch_alias: Optional[str] = None) -> None:
@@ -176,6 +319,12 @@ class GmailExchanger:
         # Build gmail api resource
         self._gmail = self._build_resource()
 
+        # Label ids are cached per account since the token can be issued
+        # for another one
+        account = self._get_account_email()
+        self._path_labels = os.path.join(
+            ROOT_PATH, 'credentials', f'gmail_labels_{account}.json')
+
         # Create label if not exists
         self._label_id = self._get_label_id(self._fetch_label)
 
@@ -197,20 +346,32 @@ class GmailExchanger:
         # Get new submissions
         message_ids = self._get_new_messages()
 
-        # Parse each submission
+        # Handle messages by batches so that only attachments of one batch
+        # are kept in memory
         submissions = []
-        for mes_id in message_ids:
-            logger.info(f'Start parsing submission with id "{mes_id}".')
-            msg = self._load_message(mes_id)
-            new_submission = Submission(
-                email=self._extract_email(msg),
-                lesson_name=self._extract_lesson_name(msg),
-                timestamp=self._extract_timestamp(msg),
-                filepath=self._extract_attachments(msg),
-                exchange_id=mes_id)
-            submissions.append(new_submission)
-            logger.info(f'Submission data from message with id "{mes_id}" '
-                        f'was parsed and saved.')
+        for start in range(0, len(message_ids), BATCH_MAX_SIZE):
+            chunk = message_ids[start:start + BATCH_MAX_SIZE]
+            messages = self._load_messages_batch(chunk)
+            blobs = self._fetch_attachment_blobs(
+                {mes_id: self._plan_attachments(messages[mes_id])
+                 for mes_id in chunk})
+
+            # Parse each submission
+            for mes_id in chunk:
+                msg = messages.pop(mes_id)
+                logger.info(f'Start parsing submission with id "{mes_id}".')
+                headers = {header['name']: header['value']
+                           for header in msg['payload']['headers']}
+                new_submission = Submission(
+                    email=self._extract_email(headers, mes_id),
+                    lesson_name=self._extract_lesson_name(headers, mes_id),
+                    timestamp=self._extract_timestamp(msg),
+                    filepath=self._save_attachments(mes_id,
+                                                    blobs.pop(mes_id)),
+                    exchange_id=mes_id)
+                submissions.append(new_submission)
+                logger.info(f'Submission data from message with id '
+                            f'"{mes_id}" was parsed and saved.')
         return submissions
 
     @slow_api_calls(min_latency=5)
@@ -221,8 +382,18 @@ class GmailExchanger:
         :return: list of new message ids.
         """
         query = 'is:unread'
-        result = self._gmail.users().messages() \
-            .list(userId='me', q=query, labelIds=[self._label_id]).execute()
+        try:
+            result = self._gmail.users().messages() \
+                .list(userId='me', q=query, labelIds=[self._label_id]) \
+                .execute()
+        except HttpError as err:
+            # The cached label could be removed, so find it again
+            if err.resp.status in (400, 404):
+                logger.warning(f'Label with id "{self._label_id}" '
+                               f'was not found.')
+                self._forget_label_id(self._fetch_label)
+                self._label_id = self._get_label_id(self._fetch_label)
+            raise
         return [msg['id'] for msg in result.get('messages', {})]
 
     @repeat_request
@@ -239,38 +410,56 @@ class GmailExchanger:
             body=mods, userId='me', id=message_id).execute()
         logger.info(f'Message with id "{message_id}" was marked as read.')
 
-    def _extract_email(self, msg: Dict[str, Any]) -> str:
-        """Extract sender email from message data.
+    @repeat_request
+    def mark_many_as_completed(self, message_ids: List[str]) -> None:
+        """Mark that several submissions were graded and feedbacks were sent.
 
-        :param msg: message data.
+        The same as `mark_as_completed`, but all messages are modified with
+        one request per `BATCH_MODIFY_MAX_SIZE` messages.
+
+        :param message_ids: ids of messages.
+        """
+        for start in range(0, len(message_ids), BATCH_MODIFY_MAX_SIZE):
+            chunk = message_ids[start:start + BATCH_MODIFY_MAX_SIZE]
+            body = {'ids': chunk, 'removeLabelIds': ['UNREAD']}
+            self._gmail.users().messages().batchModify(
+                userId='me', body=body).execute()
+            logger.info(f'Messages with ids "{chunk}" were marked as read.')
+
+    def _extract_email(self, headers: Dict[str, str],
+                       message_id: str) -> str:
+        """Extract sender email from message headers.
+
+        :param headers: values of message headers by their names.
+        :param message_id: id of the message.
         :return: email.
         """
-        headers = msg['payload']['headers']
-        sender = next(x for x in headers if x['name'] == 'From')['value']
-        match = re.search('.*<(?P<email>.*)>.*', sender)
+        sender = headers['From']
+        match = SENDER_REGEX.search(sender)
         if match:
             sender = match.group('email')
         logger.debug(f'Sender email "{sender}" was extracted '
-                     f'from the message with id "{msg["id"]}".')
+                     f'from the message with id "{message_id}".')
         return sender
 
-    def _extract_lesson_name(self, msg: Dict[str, Any]) -> str:
-        """Extract lesson name from message data.
+    def _extract_lesson_name(self, headers: Dict[str, str],
+                             message_id: str) -> str:
+        """Extract lesson name from message headers.
 
         It is considered that each message with submission has a subject of
         the structure "<gmail_keyword> / <lesson_name>".
 
-        :param msg: message data.
+        :param headers: values of message headers by their names.
+        :param message_id: id of the message.
         :return: lesson name.
         """
-        headers = msg['payload']['headers']
-        subject = next(x for x in headers if x['name'] == 'Subject')['value']
-        match = re.search('^(?P<label>.*)/(?P<lesson>.*)$', subject)
+        subject = headers['Subject']
+        match = SUBJECT_REGEX.search(subject)
         les_name = ''
         if match:
             les_name = match.group('lesson')
         logger.debug(f'Lesson name "{les_name}" extracted '
-                     f'from the message with id "{msg["id"]}".')
+                     f'from the message with id "{message_id}".')
         return les_name
 
     def _extract_timestamp(self, msg: Dict[str, Any]) -> datetime:
@@ -281,74 +470,161 @@ class GmailExchanger:
         :param msg: message data.
         :return: timestamp in UTC.
         """
-        utc_time = datetime.utcfromtimestamp(
-            int(msg['internalDate']) / 1000).replace(tzinfo=timezone.utc)
+        utc_time = UTC_EPOCH + timedelta(
+            milliseconds=int(msg['internalDate']))
         logger.debug(f'Timestamp "{utc_time.strftime(DATE_FORMAT)}" '
                      f'was extracted from the message with id "{msg["id"]}".')
         return utc_time
 
-    @repeat_request
-    def _extract_attachments(self, msg: Dict[str, Any]) -> str:
-        """Extract files from message data.
+    def _save_attachments(self, message_id: str,
+                          blobs: List[Tuple[str, str]]) -> str:
+        """Save attachments of a message.
 
         This saves all attachments of the message to the specified folder for
         downloads. If the attachment is a ZIP or TAR archive, it will be
         unpacked.
 
-        :param msg: message data.
+        :param message_id: id of the message.
+        :param blobs: filenames and base64 encoded content of the attachments.
         :return: path to folder where data was saved.
         """
         # Create folder for submission content
-        path = os.path.join(self._path_downloaded, msg['id'])
+        path = os.path.join(self._path_downloaded, message_id)
         if os.path.exists(path):
             logger.warning(f'The folder "{path}" already exists. '
                            f'Its content will be overwritten.')
             shutil.rmtree(path)
         os.makedirs(path)
 
-        # Download attachments
-        for part in msg['payload'].get('parts', {}):
-            if not part['filename']:
-                continue
-            if 'data' in part['body']:
-                data = part['body']['data']
-            else:
-                att_id = part['body']['attachmentId']
-                att = self._gmail.users().messages().attachments() \
-                    .get(userId='me', messageId=msg['id'], id=att_id) \
-                    .execute()
-                data = att['data']
-            file_data = base64.urlsafe_b64decode(data.encode('UTF-8'))
-            file_path = os.path.join(path, part['filename'])
+        # Write attachments
+        written = []
+        for filename, data in blobs:
+            file_path = os.path.join(path, filename)
             with open(file_path, 'wb') as f:
-                f.write(file_data)
-                logger.debug(f'Attachment "{part["filename"]}" of the '
-                             f'message with id "{msg["id"]}" was saved '
+                for start in range(0, len(data), B64_CHUNK_SIZE):
+                    f.write(base64.urlsafe_b64decode(
+                        data[start:start + B64_CHUNK_SIZE]))
+                logger.debug(f'Attachment "{filename}" of the '
+                             f'message with id "{message_id}" was saved '
                              f'to "{file_path}".')
+            if file_path not in written:
+                written.append(file_path)
 
         # Extract files from archives
-        for file in os.listdir(path):
-            path_file = os.path.join(path, file)
+        for path_file in written:
             try:
-                shutil.unpack_archive(path_file, path)
-                logger.debug(f'File "{path_file}" was unpacked.')
-                os.remove(path_file)
-            except shutil.ReadError:
-                pass
+                if path_file.endswith(ZIP_EXTENSIONS):
+                    with zipfile.ZipFile(path_file, allowZip64=True) as arch:
+                        arch.extractall(path)
+                elif path_file.endswith(TAR_EXTENSIONS):
+                    with tarfile.open(path_file) as arch:
+                        arch.extractall(path)
+                else:
+                    continue
+            except (zipfile.BadZipFile, tarfile.TarError):
+                logger.debug(f'File "{path_file}" is not a valid archive.')
+                continue
+            logger.debug(f'File "{path_file}" was unpacked.')
+            os.remove(path_file)
         return path
 
+    def _plan_attachments(
+            self, msg: Dict[str, Any]) -> List[Tuple[str, Dict[str, Any]]]:
+        """Find attachments of the message.
+
+        :param msg: message data.
+        :return: filenames and bodies of the attachment parts.
+        """
+        return [(part['filename'], part['body'])
+                for part in msg['payload'].get('parts', {})
+                if part['filename']]
+
     @repeat_request
-    def _load_message(self, message_id: str) -> Dict[str, Any]:
-        """Download message content.
+    def _fetch_attachment_blobs(
+            self, attachments: Dict[str, List[Tuple[str, Dict[str, Any]]]]) \
+            -> Dict[str, List[Tuple[str, str]]]:
+        """Get content of attachments of several messages.
+
+        The content which is not included in the message data is downloaded
+        with batch requests that are shared by all the messages.
+
+        :param attachments: filenames and bodies of the attachment parts by
+        message ids.
+        :return: filenames and base64 encoded content of the attachments by
+        message ids.
+        """
+        api = self._gmail.users().messages().attachments()
+        missing = {}
+        for mes_id, parts in attachments.items():
+            for index, (_, body) in enumerate(parts):
+                if 'data' not in body:
+                    missing[f'{mes_id}-{index}'] = api.get(
+                        userId='me', messageId=mes_id,
+                        id=body['attachmentId'])
+        responses = {}
+        request_ids = list(missing)
+        for start in range(0, len(request_ids), BATCH_MAX_SIZE):
+            responses.update(self._execute_batch(
+                {request_id: missing[request_id] for request_id
+                 in request_ids[start:start + BATCH_MAX_SIZE]}))
+        if missing:
+            logger.debug(f'{len(missing)} attachments of {len(attachments)} '
+                         f'messages were downloaded.')
+
+        blobs = {}
+        for mes_id, parts in attachments.items():
+            blobs[mes_id] = []
+            for index, (filename, body) in enumerate(parts):
+                if 'data' in body:
+                    data = body['data']
+                else:
+                    data = responses[f'{mes_id}-{index}']['data']
+                blobs[mes_id].append((filename, data))
+        return blobs
+
+    @slow_api_calls
+    @repeat_request
+    def _load_messages_batch(
+            self, message_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        """Download content of messages with one batch request.
 
-        :param message_id: id of the message.
-        :return: message content.
+        :param message_ids: ids of the messages (not more than
+        `BATCH_MAX_SIZE`).
+        :return: message contents by their ids.
         """
-        content = self._gmail.users().messages() \
-            .get(userId='me', id=message_id).execute()
-        logger.debug(f'Content of the message with '
-                     f'id "{message_id}" was downloaded.')
-        return content
+        messages = self._gmail.users().messages()
+        contents = self._execute_batch(
+            {mes_id: messages.get(userId='me', id=mes_id,
+                                  fields=MESSAGE_FIELDS)
+             for mes_id in message_ids})
+        logger.debug(f'Content of {len(contents)} messages '
+                     f'was downloaded with a batch request.')
+        return contents
+
+    def _execute_batch(self, requests_: Dict[str, Any]) -> Dict[str, Any]:
+        """Execute API requests as one batch HTTP request.
+
+        :param requests_: requests by their ids.
+        :return: responses by request ids.
+        :raise HttpError: if any request of the batch failed.
+        """
+        responses = {}
+        errors = []
+
+        def _callback(request_id: str, response: Any,
+                      exception: Optional[HttpError]) -> None:
+            if exception is not None:
+                errors.append(exception)
+            else:
+                responses[request_id] = response
+
+        batch = self._gmail.new_batch_http_request(callback=_callback)
+        for request_id, request in requests_.items():
+            batch.add(request, request_id=request_id)
+        batch.execute()
+        if errors:
+            raise errors[0]
+        return responses
 
     @repeat_request
     def send_feedback(self, feedback: Feedback) -> None:
@@ -357,29 +633,117 @@ class GmailExchanger:
         :param feedback: feedback that contains email address, subject and
         html content.
         """
-        # Create message
+        message = self._build_raw(feedback)
+        self._gmail.users().messages() \
+            .send(userId='me', body=message).execute()
+        logger.info(f'Message "{feedback.subject}" was sent '
+                    f'to "{feedback.email}".')
+
+    def send_feedback_bulk(self, feedbacks: List[Feedback]) -> List[int]:
+        """Send several html feedbacks with batch requests.
+
+        Each `BATCH_MAX_SIZE` feedbacks are sent with one HTTP request.
+        Failures of single messages do not stop sending of the others,
+        such messages are sent again one by one with `send_feedback`.
+
+        :param feedbacks: feedbacks that contain email address, subject and
+        html content.
+        :return: positions of the feedbacks that were not sent.
+        """
+        failed = []
+        for start in range(0, len(feedbacks), BATCH_MAX_SIZE):
+            batch_failed = self._send_feedback_batch(
+                feedbacks[start:start + BATCH_MAX_SIZE])
+            failed.extend(start + position for position in batch_failed)
+
+        # Requests of a batch are not repeated by `repeat_request`
+        not_sent = []
+        for position in failed:
+            try:
+                self.send_feedback(feedbacks[position])
+            except REPEATED_ERRORS:
+                logger.error(f'Message "{feedbacks[position].subject}" '
+                             f'was not sent to "{feedbacks[position].email}".',
+                             exc_info=True)
+                not_sent.append(position)
+        return not_sent
+
+    @repeat_request
+    def _send_feedback_batch(self, feedbacks: List[Feedback]) -> List[int]:
+        """Send html feedbacks with one batch request.
+
+        :param feedbacks: feedbacks (not more than `BATCH_MAX_SIZE`).
+        :return: positions of the feedbacks that were not sent.
+        """
+        failed = []
+        batch = self._gmail.new_batch_http_request()
+        messages = self._gmail.users().messages()
+        for position, feedback in enumerate(feedbacks):
+            request = messages.send(userId='me',
+                                    body=self._build_raw(feedback))
+            batch.add(request, callback=functools.partial(
+                self._on_send_result, feedback, position, failed))
+        batch.execute()
+        return failed
+
+    def _on_send_result(self, feedback: Feedback, position: int,
+                        failed: List[int], request_id: str, response: Any,
+                        exception: Optional[HttpError]) -> None:
+        """Handle the result of sending a feedback in a batch request.
+
+        :param feedback: sent feedback.
+        :param position: position of the feedback in the batch.
+        :param failed: positions of feedbacks that were not sent.
+        :param request_id: id of the request in the batch.
+        :param response: API response.
+        :param exception: error if the request failed, None otherwise.
+        """
+        if exception is not None:
+            failed.append(position)
+            logger.warning(f'Message "{feedback.subject}" was not sent '
+                           f'to "{feedback.email}" with a batch request: '
+                           f'{exception}')
+            return
+        logger.info(f'Message "{feedback.subject}" was sent '
+                    f'to "{feedback.email}".')
+
+    def _build_raw(self, feedback: Feedback) -> Dict[str, str]:
+        """Create the body of a send request.
+
+        :param feedback: feedback that contains email address, subject and
+        html content.
+        :return: message encoded in base64url format.
+        """
         message = MIMEMultipart()
         message['to'] = formataddr((feedback.student_name, feedback.email))
-        message['from'] = formataddr((self._send_name, self._send_email))
+        message['from'] = self._from_hdr
         message['subject'] = feedback.subject
         message.attach(MIMEText(feedback.html_body, 'html'))
         raw_message = base64.urlsafe_b64encode(
             message.as_string().encode('utf-8'))
-        message = {'raw': raw_message.decode('utf-8')}
-
-        # Send message
-        self._gmail.users().messages() \
-            .send(userId='me', body=message).execute()
-        logger.info(f'Message "{feedback.subject}" was sent '
-                    f'to "{feedback.email}".')
+        return {'raw': raw_message.decode('utf-8')}
 
     @repeat_request
     def _get_label_id(self, label_name: str) -> str:
         """Create new label or get information about existing one.
 
+        Found ids are cached in a local file, so all labels are listed
+        only once per label. A cached id is checked with one request since
+        the label could be removed or renamed.
+
         :param: label_name: name of label to create.
         :return: label id.
         """
+        label_cache = self._load_label_cache()
+        label_id = label_cache.get(label_name)
+        if label_id is not None:
+            if self._is_label_valid(label_id, label_name):
+                logger.debug(f'Id of Gmail label "{label_name}" was loaded '
+                             f'from cache.')
+                return label_id
+            logger.warning(f'Cached id of Gmail label "{label_name}" '
+                           f'is outdated.')
+
         all_labels = self._gmail.users().labels().list(userId='me').execute()
         label_info = {}
         for label in all_labels['labels']:
@@ -394,8 +758,66 @@ class GmailExchanger:
             label_info = self._gmail.users().labels() \
                 .create(userId='me', body=body).execute()
             logger.debug(f'New label "{label_info}" was created.')
+        label_cache[label_name] = label_info['id']
+        self._save_label_cache(label_cache)
         return label_info['id']
 
+    def _is_label_valid(self, label_id: str, label_name: str) -> bool:
+        """Check if the label exists and has the expected name.
+
+        :param label_id: id of label.
+        :param label_name: expected name of label.
+        :return: True if the label can be used.
+        """
+        try:
+            label = self._gmail.users().labels() \
+                .get(userId='me', id=label_id, fields='name').execute()
+        except HttpError as err:
+            if err.resp.status in (400, 404):
+                return False
+            raise
+        return label['name'] == label_name
+
+    @repeat_request
+    def _get_account_email(self) -> str:
+        """Get email of the account the token was issued for.
+
+        :return: email address.
+        """
+        profile = self._gmail.users().getProfile(userId='me').execute()
+        logger.debug(f'Gmail account "{profile["emailAddress"]}" is used.')
+        return profile['emailAddress']
+
+    def _forget_label_id(self, label_name: str) -> None:
+        """Remove label id from cache.
+
+        :param label_name: name of label.
+        """
+        label_cache = self._load_label_cache()
+        if label_cache.pop(label_name, None) is not None:
+            self._save_label_cache(label_cache)
+            logger.debug(f'Id of Gmail label "{label_name}" was removed '
+                         f'from cache.')
+
+    def _load_label_cache(self) -> Dict[str, str]:
+        """Load cached label ids.
+
+        :return: label ids by their names.
+        """
+        if not os.path.exists(self._path_labels):
+            return {}
+        with open(self._path_labels, 'r', encoding='utf-8') as file:
+            return json.load(file)
+
+    def _save_label_cache(self, label_cache: Dict[str, str]) -> None:
+        """Save label ids to cache.
+
+        :param label_cache: label ids by their names.
+        """
+        os.makedirs(os.path.dirname(self._path_labels), exist_ok=True)
+        with open(self._path_labels, 'w', encoding='utf-8') as file:
+            json.dump(label_cache, file)
+
     @repeat_request
     def _create_filter(self, label_id: str, fetch_keyword: str,
                        fetch_alias: str) -> None:
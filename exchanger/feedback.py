@@ -1,5 +1,7 @@
+import bisect
 import os
-from typing import Dict, List
+import textwrap
+from typing import Dict, Iterable, List
 
 from definitions import DATE_FORMAT, ROOT_PATH
 from utils.app_logger import get_logger
@@ -8,6 +10,116 @@ from utils.data_models import Feedback, GradeResult, GradeStatus, Task
 logger = get_logger(__name__)
 
 
+# Files of the feedback template
+TEMPLATE_NAMES = ('template.html', 'styles.css', 'error_body.html',
+                  'grades_body.html')
+
+# Placeholder of the body in the pre-rendered template
+BODY_MARKER = '\0body\0'
+
+# Upper bounds of grade ranges and pictures for them (the last one is for
+# grades above all the bounds)
+GRADE_THRESHOLDS = (20, 40, 60, 80, 99)
+GRADE_PICS = ('0_20', '21_40', '41_60', '61_80', '81_99', '100')
+
+# Html row of a task grade
+GRADE_ROW_TEMPLATE = """
+            <tr>
+                <td>{index}. {name}</td>
+                <td>{score}</td>
+                <td><img class="report-table-icon" 
+                src="{img}" alt="Mark" style="border: none; 
+                -ms-interpolation-mode: bicubic; display: block; 
+                width: 14px; height: 14px;" width="14" height="14"></td>
+            </tr>
+            """
+
+# Texts of error feedbacks
+UNKNOWN_USER_TEXT = textwrap.dedent("""
+    We have received your letter, but we do not know what to 
+    do with it. Your email is not in our database, 
+    so we cannot check the work.
+    """).strip()
+
+GRADER_FAILED_TEXT = textwrap.dedent("""
+    We received your work, but the grading process ended 
+    with an error. Probably your code consumes too much RAM, 
+    has infinite loops, or contains very deep recursions.
+    Check it and send again :)
+    """).strip()
+
+UNKNOWN_LESSON_TEXT = textwrap.dedent("""
+    We have received your submission, but the lesson name 
+    extracted from the email subject is not correct. 
+    Check it and send again :)
+    """).strip()
+
+NO_CORRECT_FILES_TEXT = textwrap.dedent("""
+    We have received your submission, but we have not found any 
+    files that are necessary for the lesson specified in the 
+    subject. Check the files and send again :)
+    """).strip()
+
+NOTEBOOK_CORRUPTED_TEXT = textwrap.dedent("""
+    We have received your submission and found necessary 
+    files in the attachment. However, our robots are confused :) 
+    Because the content of the files does not match the lesson 
+    specified in the subject.
+    """).strip()
+
+# Speeches of feedbacks depending on the score
+ZERO_SCORE_TEXT = textwrap.dedent("""
+    It seems that something went wrong, and the tasks were not solved. 
+    Try again to study the theory and reread task descriptions.<br>
+    We also recommend you use the links to additional materials. 
+    Don't be discouraged – everyone makes mistakes. 
+    We look forward to getting more letters from you.
+    """).strip()
+
+LOW_SCORE_TEXT = textwrap.dedent("""
+    You scored {score} out of {max_score} points, 
+    which is not enough for the lesson to be passed. Try again to study 
+    the theory and reread task descriptions.<br>
+    We also recommend you use the links to additional materials. 
+    Don't be discouraged – everyone makes mistakes. 
+    We look forward to getting more letters from you.
+    """).strip()
+
+GOOD_SCORE_TEXT = textwrap.dedent("""
+    It looks like you have a good understanding of the 
+    topic and scored {score} out of 
+    {max_score} points. 
+    The result is accepted and you can proceed to the next lesson.<br>
+    If you want to bring the result to perfection, 
+    find your mistakes and send the solution again. 
+    We also recommend you to look at additional materials. 
+    Perhaps you will discover something new for yourself.
+    """).strip()
+
+MAX_SCORE_TEXT = textwrap.dedent("""
+    Excellent! You have reached the maximum number of 
+    points.The result is accepted, and you can proceed to the next 
+    lesson.<br> 
+    If you want to understand the topic even better, 
+    we advise you to look at additional materials. Perhaps you will 
+    discover something new for yourself.
+    """).strip()
+
+# Text, subject tag, and picture name of feedback for each error status
+ERROR_SPECS = {
+    GradeStatus.ERROR_USERNAME_IS_ABSENT:
+        (UNKNOWN_USER_TEXT, 'Unknown user', 'unknown_user'),
+    GradeStatus.ERROR_GRADER_FAILED:
+        (GRADER_FAILED_TEXT, 'Grader failed', 'grader_failed'),
+    GradeStatus.ERROR_LESSON_IS_ABSENT:
+        (UNKNOWN_LESSON_TEXT, 'Unknown lesson', 'unknown_lesson'),
+    GradeStatus.ERROR_NO_CORRECT_FILES:
+        (NO_CORRECT_FILES_TEXT, 'No correct files', 'unknown_files'),
+    GradeStatus.ERROR_NOTEBOOK_CORRUPTED:
+        (NOTEBOOK_CORRUPTED_TEXT, 'Robots in panic', 'unknown_content'),
+}
+
+
 class FeedbackCreator:
     """Create feedbacks for users."""
 
@@ -23,10 +135,23 @@ class FeedbackCreator:
         self._course_name = course_name
         self._pics = picture_links
         self._template_path = os.path.join(ROOT_PATH, 'exchanger', 'resources')
-        self._template = self._load_template('template.html')
-        self._styles = self._load_template('styles.css')
-        self._error_body = self._load_template('error_body.html')
-        self._grades_body = self._load_template('grades_body.html')
+        templates = self._load_templates(TEMPLATE_NAMES)
+        self._template = templates['template.html']
+        self._styles = templates['styles.css']
+        self._error_body = templates['error_body.html']
+        self._grades_body = templates['grades_body.html']
+
+        # Only the body of the template changes, so render the rest once
+        self._template_head, self._template_tail = self._template.format(
+            styles=self._styles, body=BODY_MARKER,
+            python_icon=self._pics['python_logo'],
+            course_name=self._course_name).split(BODY_MARKER, 1)
+        self._grade_pics = tuple(self._pics[name] for name in GRADE_PICS)
+
+        # Methods which create feedback for each grading status
+        self._handlers = {status: self._get_error_feedback
+                          for status in ERROR_SPECS}
+        self._handlers[GradeStatus.SUCCESS] = self._get_success_feedback
 
     def get_feedback(self, grade_result: GradeResult) -> Feedback:
         """Create feedback after grading.
@@ -35,28 +160,11 @@ class FeedbackCreator:
         :return: feedback.
         """
 
-        if grade_result.status is GradeStatus.ERROR_NO_CORRECT_FILES:
-            body, subject = self._get_no_correct_files_feedback()
-
-        elif grade_result.status is GradeStatus.ERROR_NOTEBOOK_CORRUPTED:
-            body, subject = self._get_notebook_corrupted_feedback()
-
-        elif grade_result.status is GradeStatus.ERROR_LESSON_IS_ABSENT:
-            body, subject = self._get_incorrect_lesson_feedback()
-
-        elif grade_result.status is GradeStatus.ERROR_USERNAME_IS_ABSENT:
-            body, subject = self._get_absent_username_feedback()
-
-        elif grade_result.status is GradeStatus.ERROR_GRADER_FAILED:
-            body, subject = self._get_grader_failed_feedback()
-
-        elif grade_result.status is GradeStatus.SUCCESS:
-            body, subject = self._get_success_feedback(grade_result)
-        else:
+        handler = self._handlers.get(grade_result.status)
+        if handler is None:
             raise ValueError(f'Unknown grade status "{grade_result.status}".')
-        content = self._template.format(styles=self._styles, body=body,
-                                        python_icon=self._pics['python_logo'],
-                                        course_name=self._course_name)
+        body, subject = handler(grade_result)
+        content = f'{self._template_head}{body}{self._template_tail}'
         logger.info(f'Feedback for the user "{grade_result.student_id}"'
                     f' and lesson "{grade_result.lesson_name}" was created.')
 
@@ -76,8 +184,11 @@ class FeedbackCreator:
         timestamp = grade_result.timestamp.strftime(DATE_FORMAT)
         subject = f'{self._course_name} / {grade_result.lesson_name} ' \
                   f'/ {timestamp}'
-        score = sum([task.score for task in grade_result.task_grades])
-        max_score = sum([task.max_score for task in grade_result.task_grades])
+        score = 0
+        max_score = 0
+        for task in grade_result.task_grades:
+            score += task.score
+            max_score += task.max_score
         body = self._grades_body.format(
             first_name=grade_result.first_name,
             lesson_name=grade_result.lesson_name,
@@ -93,99 +204,20 @@ class FeedbackCreator:
         :param grade_sum: sum of grades for the lesson.
         :return: picture in string format.
         """
-        if grade_sum <= 20:
-            return self._pics['0_20']
-        elif grade_sum <= 40:
-            return self._pics['21_40']
-        elif grade_sum <= 60:
-            return self._pics['41_60']
-        elif grade_sum <= 80:
-            return self._pics['61_80']
-        elif grade_sum <= 99:
-            return self._pics['81_99']
-        return self._pics['100']
-
-    def _get_absent_username_feedback(self) -> (str, str):
-        """Create feedback when the user is unknown.
+        return self._grade_pics[bisect.bisect_left(GRADE_THRESHOLDS,
+                                                   grade_sum)]
 
-        :return: body and subject of the message.
-        """
-        err_text = """
-                   We have received your letter, but we do not know what to 
-                   do with it. Your email is not in our database, 
-                   so we cannot check the work.
-                   """
-        subject = f'{self._course_name} / Unknown user'
-        body = self._error_body.format(err_text=err_text,
-                                       teacher_email=self._teacher_email,
-                                       image_link=self._pics['unknown_user'])
-        return body, subject
-
-    def _get_grader_failed_feedback(self) -> (str, str):
-        """Create feedback when the grader failed during submission testing.
-
-        :return: body and subject of the message.
-        """
-        err_text = """
-                   We received your work, but the grading process ended 
-                   with an error. Probably your code consumes too much RAM, 
-                   has infinite loops, or contains very deep recursions.
-                   Check it and send again :)
-                   """
-        subject = f'{self._course_name} / Grader failed'
-        body = self._error_body.format(err_text=err_text,
-                                       teacher_email=self._teacher_email,
-                                       image_link=self._pics['grader_failed'])
-        return body, subject
-
-    def _get_incorrect_lesson_feedback(self) -> (str, str):
-        """Create feedback when the lesson name of submission is unknown.
-
-        :return: body and subject of the message.
-        """
-        err_text = """
-                   We have received your submission, but the lesson name 
-                   extracted from the email subject is not correct. 
-                   Check it and send again :)
-                   """
-        subject = f'{self._course_name} / Unknown lesson'
-        body = self._error_body.format(err_text=err_text,
-                                       teacher_email=self._teacher_email,
-                                       image_link=self._pics['unknown_lesson'])
-        return body, subject
-
-    def _get_no_correct_files_feedback(self) -> (str, str):
-        """Create feedback when the submission does not contain correct files.
+    def _get_error_feedback(self, grade_result: GradeResult) -> (str, str):
+        """Create feedback when the submission was not graded.
 
+        :param grade_result: result of grading.
         :return: body and subject of the message.
         """
-        err_text = """
-                   We have received your submission, but we have not found any 
-                   files that are necessary for the lesson specified in the 
-                   subject. Check the files and send again :)
-                   """
-        subject = f'{self._course_name} / No correct files'
+        err_text, tag, pic = ERROR_SPECS[grade_result.status]
+        subject = f'{self._course_name} / {tag}'
         body = self._error_body.format(err_text=err_text,
                                        teacher_email=self._teacher_email,
-                                       image_link=self._pics['unknown_files'])
-        return body, subject
-
-    def _get_notebook_corrupted_feedback(self) -> (str, str):
-        """Create feedback when the content of the notebook does not correspond
-        to the lesson.
-
-        :return: body and subject of the message.
-        """
-        err_text = """
-                   We have received your submission and found necessary 
-                   files in the attachment. However, our robots are confused :) 
-                   Because the content of the files does not match the lesson 
-                   specified in the subject.
-                   """
-        subject = f'{self._course_name} / Robots in panic'
-        body = self._error_body.format(
-            err_text=err_text, teacher_email=self._teacher_email,
-            image_link=self._pics['unknown_content'])
+                                       image_link=self._pics[pic])
         return body, subject
 
     def _get_grade_part(self, grades: List[Task]) -> str:
@@ -194,22 +226,15 @@ class FeedbackCreator:
         :param grades: grades and their names.
         :return: html part in string format.
         """
-        grades_part = ""
+        check_img = self._pics['check']
+        xmark_img = self._pics['xmark']
+        rows = []
         for index, task in enumerate(grades):
-            img = self._pics['check']
-            if task.score < task.max_score:
-                img = self._pics['xmark']
-            grades_part += f"""
-            <tr>
-                <td>{index + 1}. {task.name}</td>
-                <td>{round(task.score, 1)}</td>
-                <td><img class="report-table-icon" 
-                src="{img}" alt="Mark" style="border: none; 
-                -ms-interpolation-mode: bicubic; display: block; 
-                width: 14px; height: 14px;" width="14" height="14"></td>
-            </tr>
-            """
-        return grades_part
+            img = check_img if task.score >= task.max_score else xmark_img
+            rows.append(GRADE_ROW_TEMPLATE.format(
+                index=index + 1, name=task.name, score=round(task.score, 1),
+                img=img))
+        return ''.join(rows)
 
     def _get_feedback_message(self, score: float, max_score: float) -> str:
         """Create feedback speech.
@@ -219,51 +244,31 @@ class FeedbackCreator:
         :return: speech text.
         """
         if score == 0:
-            return """
-            It seems that something went wrong, and the tasks were not solved. 
-            Try again to study the theory and reread task descriptions.<br>
-            We also recommend you use the links to additional materials. 
-            Don't be discouraged – everyone makes mistakes. 
-            We look forward to getting more letters from you.
-            """
-
+            return ZERO_SCORE_TEXT
         if score <= 80:
-            return f"""
-            You scored {round(score, 0)} out of {round(max_score, 0)} points, 
-            which is not enough for the lesson to be passed. Try again to study 
-            the theory and reread task descriptions.<br>
-            We also recommend you use the links to additional materials. 
-            Don't be discouraged – everyone makes mistakes. 
-            We look forward to getting more letters from you.
-            """
-
+            return LOW_SCORE_TEXT.format(score=round(score, 0),
+                                         max_score=round(max_score, 0))
         if score <= 99:
-            return f""" It looks like you have a good understanding of the 
-            topic and scored {round(score, 0)} out of 
-            {round(max_score, 0)} points. 
-            The result is accepted and you can proceed to the next lesson.<br>
-            If you want to bring the result to perfection, 
-            find your mistakes and send the solution again. 
-            We also recommend you to look at additional materials. 
-            Perhaps you will discover something new for yourself.
-            """
-
+            return GOOD_SCORE_TEXT.format(score=round(score, 0),
+                                          max_score=round(max_score, 0))
         if score == 100:
-            return """Excellent! You have reached the maximum number of 
-            points.The result is accepted, and you can proceed to the next 
-            lesson.<br> 
-            If you want to understand the topic even better, 
-            we advise you to look at additional materials. Perhaps you will 
-            discover something new for yourself. """
-
-    def _load_template(self, name: str) -> str:
-        """Load template files.
-
-        :param name: name of template.
-        :return: template content.
+            return MAX_SCORE_TEXT
+
+    def _load_templates(self, names: Iterable[str]) -> Dict[str, str]:
+        """Load template files with a single scan of the template folder.
+
+        :param names: names of templates.
+        :return: template contents by names.
         """
-        template_path = os.path.join(self._template_path, name)
-        with open(template_path, 'r', encoding='utf-8') as file:
-            content = file.read()
+        with os.scandir(self._template_path) as it:
+            files = {entry.name: entry.path for entry in it
+                     if entry.is_file()}
+        templates = {}
+        for name in names:
+            if name not in files:
+                raise FileNotFoundError(
+                    f'Feedback template "{name}" was not found.')
+            with open(files[name], 'r', encoding='utf-8') as file:
+                templates[name] = file.read()
             logger.debug(f'Feedback template "{name}" was loaded.')
-            return content
+        return templates
@@ -1,15 +1,22 @@
 import datetime
+import time
 from typing import Any
 from typing import Dict
 from typing import List
+from typing import Tuple
 
+import orjson
+from sqlalchemy import bindparam
 from sqlalchemy import Column
 from sqlalchemy import DateTime
 from sqlalchemy import func
+from sqlalchemy import inspect
 from sqlalchemy import LargeBinary
 from sqlalchemy import MetaData
 from sqlalchemy import Table
 from sqlalchemy import Text
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
 from sqlalchemy.engine import create_engine
 from sqlalchemy.sql import select
 
@@ -18,6 +25,24 @@ from utils.data_models import Task
 
 logger = get_logger(__name__)
 
+# Dialects that can check for any table without listing all of them
+INFORMATION_SCHEMA_DIALECTS = ('mysql', 'postgresql')
+ANY_TABLE_QUERY = text('SELECT 1 FROM information_schema.tables '
+                       'WHERE table_schema = :schema LIMIT 1')
+
+# Seconds for which found lessons and users are cached, they can be edited
+# by other processes
+INFO_CACHE_TTL = 300
+
+
+def serialize_tasks(tasks: List[Task]) -> str:
+    """Serialize task grades for the "task_grades" column.
+
+    :param tasks: grades per task.
+    :return: JSON array of task grades.
+    """
+    return orjson.dumps(tasks).decode('utf-8')
+
 
 class DatabaseHandler:
     """Database handler."""
@@ -27,8 +52,19 @@ class DatabaseHandler:
 
         :param db_url: database url.
         """
-        self._engine = create_engine(db_url, pool_recycle=3600)
+        self._engine = create_engine(db_url, pool_recycle=3600,
+                                     pool_pre_ping=True)
         self._meta = MetaData(bind=self._engine)
+        self._compiled_cache = {}
+        self._lesson_stmt = None
+        self._user_stmt = None
+        self._log_table = None
+        self._log_insert = None
+        self._caches_expire = 0.0
+
+        # Unknown lessons and users are not cached since they can be added
+        self._lesson_cache = {}
+        self._user_cache = {}
         self.refresh_metadata()
 
     def log_submission(self, user_name: str, lesson_name: str,
@@ -43,73 +79,152 @@ class DatabaseHandler:
         :param task_grades: grades per task.
         :param timestamp: submission timestamp.
         """
-        # For the first start
-        if 'submission_logs' not in self._meta.tables:
-            self._create_submission_log_table()
+        row = {'user_name': user_name,
+               'submitted_notebook': notebook,
+               'lesson_name': lesson_name,
+               'task_grades': serialize_tasks(task_grades),
+               'timestamp': timestamp,
+               'feedback_standard': standard_feedback}
+        with self._engine.begin() as connection:
+            connection.execute(self._log_insert, row)
+        logger.debug(f'Submission of student "{user_name}" '
+                     f'for lesson "{lesson_name}" was saved '
+                     f'to the "submission_logs" table.')
 
-        with self._engine.connect() as connection:
-            log_table = self._meta.tables['submission_logs']
-            ins = log_table.insert().values(
-                user_name=user_name, submitted_notebook=notebook,
-                lesson_name=lesson_name, task_grades=str(task_grades),
-                timestamp=timestamp, feedback_standard=standard_feedback)
-            connection.execute(ins)
-            logger.debug(f'Submission of student "{user_name}" '
-                         f'for lesson "{lesson_name}" was saved '
-                         f'to the "submission_logs" table.')
+    def get_submission_context(self, email: str, lesson_name: str) \
+            -> Tuple[Dict[str, Any], Dict[str, Any]]:
+        """Get information about user and lesson of submission.
+
+        Those that are not cached are loaded through one connection.
+
+        :param email: user's email.
+        :param lesson_name: lesson name.
+        :return: information about the user and the lesson, empty dicts
+        if they do not exist.
+        """
+        self._expire_caches()
+        email = email.lower()
+        lesson_name = lesson_name.lower()
+        user_info = self._user_cache.get(email)
+        les_info = self._lesson_cache.get(lesson_name)
+        if user_info is None or les_info is None:
+            with self._engine.connect() as connection:
+                if user_info is None:
+                    user_info = self._load_user_info(connection, email)
+                if les_info is None:
+                    les_info = self._load_lesson_info(connection,
+                                                      lesson_name)
+        return dict(user_info), dict(les_info)
 
     def get_lesson_info(self, lesson_name: str) -> Dict[str, Any]:
         """Get information about lesson.
 
+        Found lessons are cached for `INFO_CACHE_TTL` seconds or until
+        `invalidate_caches` is called.
+
         :param lesson_name: lesson name.
         :return: information about the lesson.
         """
-        with self._engine.connect() as connection:
-            les_tab = self._meta.tables['assignment']
-            q_filter = func.lower(les_tab.c.name) == lesson_name.lower()
-            lesson_sql = select(['*']).where(q_filter)
-            result = connection.execute(lesson_sql).first()
-            les_info = {}
-            if result:
-                les_info = dict(result)
-            logger.debug(f'The following information about lesson with '
-                         f'name "{lesson_name}" was loaded: {les_info}.')
-            return les_info
+        self._expire_caches()
+        lesson_name = lesson_name.lower()
+        les_info = self._lesson_cache.get(lesson_name)
+        if les_info is None:
+            with self._engine.connect() as connection:
+                les_info = self._load_lesson_info(connection, lesson_name)
+        return dict(les_info)
+
+    def _load_lesson_info(self, connection: Connection,
+                          lesson_name: str) -> Dict[str, Any]:
+        """Load information about lesson from the database.
+
+        :param connection: database connection.
+        :param lesson_name: lesson name in lower case.
+        :return: information about the lesson, empty dict if it does not
+        exist.
+        """
+        result = connection.execution_options(
+            compiled_cache=self._compiled_cache).execute(
+            self._lesson_stmt, name=lesson_name).first()
+        les_info = {}
+        if result:
+            les_info = dict(result)
+            self._lesson_cache[lesson_name] = les_info
+        logger.debug(f'The following information about lesson with '
+                     f'name "{lesson_name}" was loaded: {les_info}.')
+        return les_info
 
     def get_user_info(self, email: str) -> Dict[str, Any]:
         """Get information about user by email.
 
+        Found users are cached for `INFO_CACHE_TTL` seconds or until
+        `invalidate_caches` is called.
+
         :param email: user's email.
         :return: dict with first name, last name, and email if the user
         exists, empty dict otherwise.
         """
-        with self._engine.connect() as connection:
-            users_table = self._meta.tables['student']
-            q_filter = func.lower(users_table.c.email) == email.lower()
-            user_sql = select(['*']).where(q_filter)
-            result = connection.execute(user_sql).first()
-            user_info = {}
-            if result:
-                user_info = dict(result)
-            logger.debug(f'The following information about user with '
-                         f'email "{email}" was loaded: {user_info}.')
-            return user_info
-
-    def _create_submission_log_table(self) -> None:
-        """Create table to log submissions if it does not exist."""
-        new_table = Table(
-            'submission_logs', self._meta,
-            Column('timestamp', DateTime, nullable=False),
-            Column('user_name', Text, nullable=False),
-            Column('lesson_name', Text, nullable=False),
-            Column('task_grades', Text, nullable=False),
-            Column('submitted_notebook', LargeBinary(length=1e9),
-                   nullable=False),
-            Column('feedback_standard', LargeBinary(length=1e9),
-                   nullable=False))
-        new_table.create(bind=self._engine)
-        logger.debug('Table "submission_logs" was created.')
-        self.refresh_metadata()
+        self._expire_caches()
+        email = email.lower()
+        user_info = self._user_cache.get(email)
+        if user_info is None:
+            with self._engine.connect() as connection:
+                user_info = self._load_user_info(connection, email)
+        return dict(user_info)
+
+    def _load_user_info(self, connection: Connection,
+                        email: str) -> Dict[str, Any]:
+        """Load information about user from the database.
+
+        :param connection: database connection.
+        :param email: user's email in lower case.
+        :return: information about the user, empty dict if the user does
+        not exist.
+        """
+        result = connection.execution_options(
+            compiled_cache=self._compiled_cache).execute(
+            self._user_stmt, email=email).first()
+        user_info = {}
+        if result:
+            user_info = dict(result)
+            self._user_cache[email] = user_info
+        logger.debug(f'The following information about user with '
+                     f'email "{email}" was loaded: {user_info}.')
+        return user_info
+
+    def invalidate_caches(self) -> None:
+        """Drop cached information about lessons and users."""
+        self._lesson_cache.clear()
+        self._user_cache.clear()
+        logger.debug('Cached lessons and users were dropped.')
+
+    def _expire_caches(self) -> None:
+        """Drop cached lessons and users if their time to live is over."""
+        now = time.monotonic()
+        if now >= self._caches_expire:
+            self._caches_expire = now + INFO_CACHE_TTL
+            self.invalidate_caches()
+
+    def ensure_submission_log_table(self) -> None:
+        """Create table to log submissions if it does not exist.
+
+        It should be called after nbgrader and alembic have set up the
+        database, since they check if the database is empty.
+        """
+        if 'submission_logs' not in self._meta.tables:
+            new_table = Table(
+                'submission_logs', self._meta,
+                Column('timestamp', DateTime, nullable=False),
+                Column('user_name', Text, nullable=False),
+                Column('lesson_name', Text, nullable=False),
+                Column('task_grades', Text, nullable=False),
+                Column('submitted_notebook', LargeBinary(length=int(1e9)),
+                       nullable=False),
+                Column('feedback_standard', LargeBinary(length=int(1e9)),
+                       nullable=False))
+            new_table.create(bind=self._engine)
+            logger.debug('Table "submission_logs" was created.')
+        self._log_table = self._meta.tables['submission_logs']
+        self._log_insert = self._log_table.insert()
 
     def stop_db_connection(self) -> None:
         """Close all database connections."""
@@ -121,9 +236,32 @@ class DatabaseHandler:
 
         :return: True if empty, False otherwise.
         """
-        return not self._engine.table_names()
+        if self._engine.dialect.name not in INFORMATION_SCHEMA_DIALECTS:
+            return not inspect(self._engine).get_table_names()
+        with self._engine.connect() as connection:
+            found = connection.execute(
+                ANY_TABLE_QUERY,
+                schema=self._engine.dialect.default_schema_name).first()
+        return found is None
 
     def refresh_metadata(self) -> None:
         """Refresh metadata when database is modified from the outside."""
         self._meta.reflect()
+        self._prepare_statements()
+        self.invalidate_caches()
         logger.debug('Database metadata loaded.')
+
+    def _prepare_statements(self) -> None:
+        """Build queries with bound parameters for reflected tables."""
+        self._compiled_cache.clear()
+        if 'assignment' in self._meta.tables:
+            les_tab = self._meta.tables['assignment']
+            self._lesson_stmt = select([les_tab]).where(
+                func.lower(les_tab.c.name) == bindparam('name'))
+        if 'student' in self._meta.tables:
+            users_table = self._meta.tables['student']
+            self._user_stmt = select([users_table]).where(
+                func.lower(users_table.c.email) == bindparam('email'))
+        if 'submission_logs' in self._meta.tables:
+            self._log_table = self._meta.tables['submission_logs']
+            self._log_insert = self._log_table.insert()
@@ -1,38 +1,294 @@
-import json
+import errno
+import functools
 import os
 import re
 import shutil
-from collections import Counter
-from datetime import datetime
-from json import JSONDecodeError
-from typing import List
-
-import alembic.command
-import alembic.config
-from dateutil import parser
-from nbgrader.apps import NbGraderAPI
+import threading
+import time
+import uuid
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager
+from dataclasses import replace
+from datetime import datetime, timezone
+from typing import Any, FrozenSet, Iterator, List, Optional, Tuple
+
+import ijson
+import orjson
 from traitlets.config import Config
 
 from definitions import DATE_FORMAT, ROOT_PATH, TASK_NAME_PATTERN
-from grader.database import DatabaseHandler
+from grader.database import DatabaseHandler, INFO_CACHE_TTL
 from utils.app_logger import get_logger
 from utils.data_models import GradeResult, GradeStatus, Submission, Task
 
 logger = get_logger(__name__)
 
+# Folders of source lessons, submissions, nbgrader feedbacks, removed
+# folders, and migrations
+SOURCE_ROOT = os.path.join(ROOT_PATH, 'source')
+SUBMITTED_ROOT = os.path.join(ROOT_PATH, 'submitted')
+FEEDBACK_ROOT = os.path.join(ROOT_PATH, 'feedback')
+TRASH_ROOT = os.path.join(ROOT_PATH, 'trash')
+ALEMBIC_ROOT = os.path.join(ROOT_PATH, 'alembic')
+
+# Databases whose custom schema was upgraded by this process
+SCHEMA_CHECKED = set()
+
+# Level prefix of nbgrader log lines
+LOG_PREFIX_REGEX = re.compile(r'\[\w+\] ')
+
+# Markdown cell with the task name
+TASK_NAME_REGEX = re.compile(TASK_NAME_PATTERN)
+
+# Chunk size of kernel-side copying and buffer size of the other file
+# copying of submission files
+KERNEL_COPY_CHUNK = 1 << 30
+COPY_BUFSIZE = 1 << 20
+
+
+def copy_file(src: str, dst: str, size: int) -> None:
+    """Copy file content without passing it through user space if possible.
+
+    :param src: source path.
+    :param dst: destination path.
+    :param size: size of the source file.
+    """
+    with open(src, 'rb', buffering=COPY_BUFSIZE) as fsrc, \
+            open(dst, 'wb', buffering=COPY_BUFSIZE) as fdst:
+        if not size:
+            return
+        in_fd, out_fd = fsrc.fileno(), fdst.fileno()
+        for name in ('copy_file_range', 'sendfile'):
+            kernel_copy = getattr(os, name, None)
+            if kernel_copy is None:
+                continue
+            try:
+                copied = 0
+                while copied < size:
+                    if name == 'sendfile':
+                        sent = os.sendfile(out_fd, in_fd, None,
+                                           KERNEL_COPY_CHUNK)
+                    else:
+                        sent = os.copy_file_range(in_fd, out_fd,
+                                                  KERNEL_COPY_CHUNK)
+                    if not sent:
+                        break
+                    copied += sent
+                return
+            except OSError:
+                # Unsupported by the filesystem, start over with the next way
+                fsrc.seek(0)
+                fdst.seek(0)
+                fdst.truncate()
+        shutil.copyfileobj(fsrc, fdst, COPY_BUFSIZE)
+
+
+@functools.lru_cache(maxsize=64)
+def load_lesson_tasks(path_notebook: str, mtime_ns: int) -> Tuple[Task, ...]:
+    """Load task description for each test cell of original assignment.
+
+    Results are cached, the modification time of the notebook is a part of
+    the key, so edited assignments are loaded again.
+
+    :param path_notebook: path to the original assignment.
+    :param mtime_ns: modification time of the notebook.
+    :return: tasks in the right order.
+    """
+    with open(path_notebook, 'rb') as file:
+        notebook = orjson.loads(file.read())
+
+    # Extract grade names in one pass with the lookups bound to locals
+    match_task_name = TASK_NAME_REGEX.match
+    tasks = []
+    append_task = tasks.append
+    task = None
+    for cell in notebook['cells']:
+        nb_data = cell['metadata'].get('nbgrader')
+        if not nb_data:
+            continue
+        cell_type = cell['cell_type']
+
+        # If it is a task name cell
+        if cell_type == 'markdown':
+            source = cell['source']
+            is_todo = match_task_name(source[0]) if source else None
+            if is_todo:
+                task = Task(name=is_todo['name'])
+
+        # If it is a test cell
+        elif cell_type == 'code' and nb_data['grade']:
+            task.test_cell = nb_data['grade_id']
+            append_task(task)
+    logger.debug(f'Task names were extracted from "{path_notebook}".')
+    return tuple(tasks)
+
+
+@functools.lru_cache(maxsize=None)
+def get_alembic_scripts() -> Tuple[Any, Any]:
+    """Load alembic config and migration scripts.
+
+    All the migration files are parsed here, so it is done once per process.
+
+    :return: alembic config and script directory.
+    """
+    import alembic.config
+    import alembic.script
+    alembic_cfg = alembic.config.Config()
+    alembic_cfg.set_main_option('script_location', ALEMBIC_ROOT)
+    scripts = alembic.script.ScriptDirectory.from_config(alembic_cfg)
+    return alembic_cfg, scripts
+
+
+def clean_log(log: str) -> str:
+    """Strip level prefixes of nbgrader log and join it into one line.
+
+    :param log: nbgrader log.
+    :return: cleaned log.
+    """
+    # Two C-level passes are faster than one pass with a Python callback
+    return LOG_PREFIX_REGEX.sub('', log).replace('\n', '. ')
+
+
+def parse_timestamp(timestamp: str) -> datetime:
+    """Parse timestamp of the submitted folder.
+
+    :param timestamp: timestamp in ISO format, or in `DATE_FORMAT` in UTC
+    as it was written before.
+    :return: timestamp with the time zone.
+    """
+    try:
+        return datetime.fromisoformat(timestamp)
+    except ValueError:
+        # Old timestamps, strptime drops the zone name
+        return datetime.strptime(timestamp, DATE_FORMAT) \
+            .replace(tzinfo=timezone.utc)
+
+
+def completed_future(result: GradeResult) -> Future:
+    """Wrap grading result that is known in advance into a future.
+
+    :param result: grading result.
+    :return: completed future.
+    """
+    future = Future()
+    future.set_result(result)
+    return future
+
+
+def fast_copytree(src: str, dst: str) -> None:
+    """Copy directory tree using kernel-side copying of files.
+
+    :param src: source directory.
+    :param dst: destination directory.
+    """
+    folders = [(src, dst)]
+    while folders:
+        src_dir, dst_dir = folders.pop()
+        os.makedirs(dst_dir, exist_ok=True)
+        with os.scandir(src_dir) as it:
+            for entry in it:
+                dst_path = os.path.join(dst_dir, entry.name)
+                if entry.is_dir(follow_symlinks=False):
+                    folders.append((entry.path, dst_path))
+                else:
+                    copy_file(entry.path, dst_path, entry.stat().st_size)
+
+
+class _GraderReject(Exception):
+    """Submission does not pass the checks and will not be graded."""
+
+    def __init__(self, status: GradeStatus, reason: str) -> None:
+        """Create reject.
+
+        :param status: grading status of the submission.
+        :param reason: description to log.
+        """
+        super().__init__(reason)
+        self.status = status
+        self.reason = reason
+
+
+class PooledGradebook:
+    """Gradebook that keeps its engine between uses.
+
+    Nbgrader disposes the engine of a gradebook when it is closed, so each
+    use reconnects to the database and checks the schema again. Here each
+    thread keeps its session, leaving the outermost context only expunges
+    loaded objects and returns the connection to the pool.
+    """
+
+    def __init__(self, db_url: str, course_id: str) -> None:
+        """Open gradebook.
+
+        :param db_url: database url.
+        :param course_id: course id.
+        """
+        from nbgrader.api import Gradebook
+        self._gradebook = Gradebook(db_url, course_id)
+        self.engine = self._gradebook.db.bind
+        self._local = threading.local()
+
+    def __enter__(self) -> Any:
+        # Nested uses in the same thread share the session
+        self._local.depth = getattr(self._local, 'depth', 0) + 1
+        return self._gradebook
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self._local.depth -= 1
+        if not self._local.depth:
+            self._gradebook.db.close()
+
+    def dispose(self) -> None:
+        """Close all connections of the gradebook."""
+        self._gradebook.db.remove()
+        self.engine.dispose()
+
 
 class Grader:
     """Grader class."""
 
-    def __init__(self, grader_config: Config) -> None:
+    def __init__(self, grader_config: Config,
+                 max_workers: Optional[int] = None) -> None:
         """Create grader.
 
         :param grader_config: grader configuration.
+        :param max_workers: number of submissions graded in parallel,
+        the number of CPUs by default.
         """
         self._config = grader_config
         self._db = DatabaseHandler(self._config.CourseDirectory.db_url)
+        # Nbgrader and alembic are heavy, so they are imported on first use
+        from nbgrader.apps import NbGraderAPI
         self._nb_grader = NbGraderAPI(config=self._config)
+        self._pool = ThreadPoolExecutor(
+            max_workers=max_workers or os.cpu_count(),
+            thread_name_prefix='grader')
+
+        # Submissions of the same user for the same lesson are graded one by
+        # one. Nbgrader calls are always serialized: they set the student
+        # and the assignment on the shared course directory and change the
+        # working directory of the process.
+        self._submission_locks = {}
+        self._submission_locks_guard = threading.Lock()
+        self._nbgrader_lock = threading.Lock()
+
+        # Lessons can be republished by another process, so cells of each
+        # lesson are cached for a limited time
+        self._source_cells = {}
+
+        # Directories are removed in background after moving them to trash
+        self._rm_pool = ThreadPoolExecutor(max_workers=2,
+                                           thread_name_prefix='grader-rm')
+        self._trash_path = TRASH_ROOT
+        os.makedirs(self._trash_path, exist_ok=True)
+        with os.scandir(self._trash_path) as it:
+            for entry in it:
+                self._rm_pool.submit(shutil.rmtree, entry.path,
+                                     ignore_errors=True)
+        self._gradebook = None
+        self._open_gradebook()
         self._check_schema()
+        self._db.ensure_submission_log_table()
         logger.info('Grader started successfully.')
 
     def grade_submission(self, submission: Submission) -> GradeResult:
@@ -44,119 +300,218 @@ class Grader:
         :param submission: submission.
         :return: grading result.
         """
+        return self.submit_submission(submission).result()
+
+    def submit_submission(self, submission: Submission) -> Future:
+        """Check submission parameters and schedule its grading.
+
+        User and lesson are checked right away, while the rest of the
+        grading is run in the worker pool.
+
+        :param submission: submission.
+        :return: future of the grading result.
+        """
         logger.info(f'Start grading the submission: {submission}.')
         grade_result = GradeResult(status=GradeStatus.SUCCESS,
                                    timestamp=submission.timestamp,
                                    email=submission.email)
 
-        # Get user information
-        user_info = self._db.get_user_info(submission.email)
-        if not user_info:
-            logger.info(f'The information about user with '
-                        f'email "{submission.email}" was not found.')
-            grade_result.status = GradeStatus.ERROR_USERNAME_IS_ABSENT
-            shutil.rmtree(submission.filepath)
-            logger.debug(f'Data of submission "{submission.exchange_id} was '
-                         f'dropped from downloaded folder."')
-            return grade_result
-        user_ = user_info['id']
-        grade_result.email = user_info['email']
-        grade_result.student_id = user_info['id']
-        grade_result.first_name = user_info['first_name']
-        grade_result.last_name = user_info['last_name']
-
-        # Get lesson information
-        lesson_info = self._db.get_lesson_info(submission.lesson_name)
-        if not lesson_info:
-            logger.info(f'The information about lesson with name '
-                        f'"{submission.lesson_name}" was not found.')
-            grade_result.status = GradeStatus.ERROR_LESSON_IS_ABSENT
-            shutil.rmtree(submission.filepath)
-            logger.debug(f'Data of submission "{submission.exchange_id} was '
-                         f'dropped from downloaded folder."')
-            return grade_result
-        lesson_ = lesson_info['name']
-        grade_result.lesson_name = lesson_info['name']
-        grade_result.due_date = lesson_info['duedate']
-
-        # Check if the file for this lesson exists
-        downloaded_path = os.path.join(submission.filepath, f'{lesson_}.ipynb')
-        if not os.path.exists(downloaded_path):
-            logger.info('The notebook for grading was not found among '
-                        'submitted files.')
-            grade_result.status = GradeStatus.ERROR_NO_CORRECT_FILES
-            shutil.rmtree(submission.filepath)
-            logger.debug(f'Data of submission "{submission.exchange_id} was '
-                         f'dropped from downloaded folder."')
-            return grade_result
-
-        # Check if the submission is newer than the existing one
-        submitted_path = os.path.join(ROOT_PATH, 'submitted', user_, lesson_)
-        if not self._is_submission_newer(submitted_path, submission.timestamp):
-            logger.info('The submission is not newer than the existing one. '
-                        'Skip it.')
-            grade_result.status = GradeStatus.SKIPPED
-            shutil.rmtree(submission.filepath)
-            logger.debug(f'Data of submission "{submission.exchange_id} was '
-                         f'dropped from downloaded folder."')
-            return grade_result
+        try:
+            # Get user and lesson information
+            user_info, lesson_info = self._db.get_submission_context(
+                submission.email, submission.lesson_name)
+            if not user_info:
+                raise _GraderReject(
+                    GradeStatus.ERROR_USERNAME_IS_ABSENT,
+                    f'The information about user with '
+                    f'email "{submission.email}" was not found.')
+            grade_result.email = user_info['email']
+            grade_result.student_id = user_info['id']
+            grade_result.first_name = user_info['first_name']
+            grade_result.last_name = user_info['last_name']
+
+            if not lesson_info:
+                raise _GraderReject(
+                    GradeStatus.ERROR_LESSON_IS_ABSENT,
+                    f'The information about lesson with name '
+                    f'"{submission.lesson_name}" was not found.')
+            grade_result.lesson_name = lesson_info['name']
+            grade_result.due_date = lesson_info['duedate']
+
+            # Check if the file for this lesson exists
+            downloaded_path = os.path.join(submission.filepath,
+                                           f'{lesson_info["name"]}.ipynb')
+            if not os.path.exists(downloaded_path):
+                raise _GraderReject(
+                    GradeStatus.ERROR_NO_CORRECT_FILES,
+                    'The notebook for grading was not found among '
+                    'submitted files.')
+        except _GraderReject as reject:
+            self._reject_submission(submission, grade_result, reject)
+            return completed_future(grade_result)
+        return self._pool.submit(self._grade_worker, submission,
+                                 grade_result, downloaded_path)
+
+    def _grade_worker(self, submission: Submission, grade_result: GradeResult,
+                      downloaded_path: str) -> GradeResult:
+        """Grade submission with checked user and lesson.
 
-        # Check the notebook structure
-        if not self._is_notebook_valid(downloaded_path, lesson_):
-            logger.info(f'Structure of the notebook '
+        :param submission: submission.
+        :param grade_result: grading result with user and lesson info.
+        :param downloaded_path: path to the downloaded notebook.
+        :return: grading result.
+        """
+        user_ = grade_result.student_id
+        lesson_ = grade_result.lesson_name
+        with self._lock_submission(user_, lesson_):
+            submitted_path = os.path.join(SUBMITTED_ROOT, user_, lesson_)
+            try:
+                # Check if the submission is newer than the existing one
+                if not self._is_submission_newer(submitted_path,
+                                                 submission.timestamp):
+                    raise _GraderReject(
+                        GradeStatus.SKIPPED,
+                        'The submission is not newer than the existing '
+                        'one. Skip it.')
+
+                # Check the notebook structure
+                if not self._is_notebook_valid(downloaded_path, lesson_):
+                    raise _GraderReject(
+                        GradeStatus.ERROR_NOTEBOOK_CORRUPTED,
+                        f'Structure of the notebook '
                         f'"{downloaded_path}" is corrupted.')
-            grade_result.status = GradeStatus.ERROR_NOTEBOOK_CORRUPTED
-            shutil.rmtree(submission.filepath)
-            logger.debug(f'Data of submission "{submission.exchange_id} was '
-                         f'dropped from downloaded folder."')
+            except _GraderReject as reject:
+                self._reject_submission(submission, grade_result, reject)
+                return grade_result
+
+            # Test the submission
+            notebook = self._move_checked_files(
+                submission.filepath, submitted_path, submission.timestamp,
+                f'{lesson_}.ipynb')
+
+            # One gradebook session for all the steps of grading, it is
+            # first queried after autograding, so it sees the new grades
+            with self._nbgrader_lock, self._gradebook:
+                if not self._autograde(lesson_, user_):
+                    grade_result.status = GradeStatus.ERROR_GRADER_FAILED
+                    return grade_result
+                grades = self._get_submission_grades(lesson_, user_)
+                grade_result.task_grades = grades
+
+                # Generate standard feedback
+                feedback = self._create_nbgrader_feedback(lesson_, user_)
+
+            # Save submission info to database
+            self._db.log_submission(user_, lesson_, grades,
+                                    submission.timestamp, feedback, notebook)
             return grade_result
 
-        # Test the submission
-        self._move_checked_files(submission.filepath, submitted_path,
-                                 submission.timestamp)
-        if not self._autograde(lesson_, user_):
-            grade_result.status = GradeStatus.ERROR_GRADER_FAILED
-            return grade_result
-        grades = self._get_submission_grades(lesson_, user_)
-        grade_result.task_grades = grades
+    @contextmanager
+    def _lock_submission(self, user_id: str, lesson_name: str) \
+            -> Iterator[None]:
+        """Lock submissions of the user for the lesson.
 
-        # Generate standard feedback
-        feedback = self._create_nbgrader_feedback(lesson_, user_)
+        The lock is dropped when no submission waits for it.
 
-        # Save submission info to database
-        with open(os.path.join(submitted_path, f'{lesson_}.ipynb'), 'rb') as f:
-            notebook = f.read()
-        self._db.log_submission(user_, lesson_, grades, submission.timestamp,
-                                feedback, notebook)
-        return grade_result
+        :param user_id: user id.
+        :param lesson_name: name of the lesson.
+        """
+        key = (user_id, lesson_name)
+        with self._submission_locks_guard:
+            lock, waiting = self._submission_locks.get(
+                key, (threading.Lock(), 0))
+            self._submission_locks[key] = (lock, waiting + 1)
+        try:
+            with lock:
+                yield
+        finally:
+            with self._submission_locks_guard:
+                lock, waiting = self._submission_locks[key]
+                if waiting == 1:
+                    del self._submission_locks[key]
+                else:
+                    self._submission_locks[key] = (lock, waiting - 1)
+
+    def _reject_submission(self, submission: Submission,
+                           grade_result: GradeResult,
+                           reject: _GraderReject) -> None:
+        """Set the reject status and drop downloaded files of submission.
+
+        :param submission: submission.
+        :param grade_result: grading result.
+        :param reject: reason why the submission will not be graded.
+        """
+        logger.info(reject.reason)
+        grade_result.status = reject.status
+        self._rmtree_async(submission.filepath)
+        logger.debug(f'Data of submission "{submission.exchange_id} was '
+                     f'dropped from downloaded folder."')
+
+    def _rmtree_async(self, path: str) -> None:
+        """Remove directory tree in background.
+
+        The tree is moved to the trash folder first, so the path can be
+        reused right away. If it cannot be moved (e.g., it is on another
+        filesystem), it is removed in place.
+
+        :param path: path to directory.
+        """
+        trash_path = os.path.join(self._trash_path, uuid.uuid4().hex)
+        try:
+            os.replace(path, trash_path)
+        except OSError:
+            shutil.rmtree(path)
+            return
+        self._rm_pool.submit(shutil.rmtree, trash_path, ignore_errors=True)
 
     def _move_checked_files(self, downloaded_path: str, submitted_path: str,
-                            timestamp: datetime) -> None:
+                            timestamp: datetime, notebook_name: str) -> bytes:
         """Move files from downloaded folder to submitted folder.
 
         :param downloaded_path: path to files in downloaded folder.
         :param submitted_path: path to files in submitted folder.
         :param timestamp: submission timestamp.
+        :param notebook_name: file name of the submitted notebook.
+        :return: content of the submitted notebook.
         """
-        # Copy all files
-        if os.path.exists(submitted_path):
-            shutil.rmtree(submitted_path)
-            logger.info(f'Submitted directory "{submitted_path}" was cleared.')
-        shutil.copytree(downloaded_path, submitted_path)
+        # Files are prepared next to the submitted folder, so it is swapped
+        # with two renames and is never seen partially written
+        staging_path = f'{submitted_path}.new'
+        if os.path.exists(staging_path):
+            self._rmtree_async(staging_path)
+        os.makedirs(os.path.dirname(submitted_path), exist_ok=True)
+
+        # Downloaded files are moved by renaming the folder if it is on the
+        # same filesystem, otherwise they are copied
+        try:
+            os.replace(downloaded_path, staging_path)
+        except OSError as err:
+            if err.errno != errno.EXDEV:
+                raise
+            fast_copytree(downloaded_path, staging_path)
+            self._rmtree_async(downloaded_path)
+            logger.debug(f'Downloaded files were removed '
+                         f'from "{downloaded_path}".')
+
+        # Keep the notebook to log it after grading
+        with open(os.path.join(staging_path, notebook_name), 'rb') as file:
+            notebook = file.read()
 
         # Add timestamp information
-        timestamp_path = os.path.join(submitted_path, 'timestamp.txt')
-        with open(timestamp_path, 'w') as file:
-            timestamp_str = timestamp.strftime(DATE_FORMAT)
-            file.write(timestamp.strftime(DATE_FORMAT))
+        timestamp_path = os.path.join(staging_path, 'timestamp.txt')
+        timestamp_str = timestamp.isoformat()
+        with open(timestamp_path, 'wb', buffering=0) as file:
+            file.write(timestamp_str.encode('ascii'))
         logger.debug(f'Submission timestamp "{timestamp_str}" was written '
                      f'to "{timestamp_path}".')
-        logger.info(f'Submission files were moved to "{submitted_path}".')
 
-        # Remove files from downloaded folder
-        shutil.rmtree(downloaded_path)
-        logger.debug(f'Downloaded files were removed '
-                     f'from "{downloaded_path}".')
+        # Swap the previous submission with the new one
+        if os.path.exists(submitted_path):
+            self._rmtree_async(submitted_path)
+            logger.info(f'Submitted directory "{submitted_path}" was cleared.')
+        os.replace(staging_path, submitted_path)
+        logger.info(f'Submission files were moved to "{submitted_path}".')
+        return notebook
 
     def _autograde(self, lesson_name: str, user_id: str) -> bool:
         """Run autograding process.
@@ -168,17 +523,17 @@ class Grader:
         logger.debug(f'Start autograding of user "{user_id}" '
                      f'for lesson "{lesson_name}.')
         status = self._nb_grader.autograde(lesson_name, user_id, create=False)
-        logs = re.sub(r'\[\w+\] ', '', status['log']).replace('\n', '. ')
+        logs = clean_log(status['log'])
         logger.debug(f'Grader output: {logs}')
         if not status['success']:
             logger.error(f'Traceback: {status.get("error")}')
-            with self._nb_grader.gradebook as gb:
+            with self._gradebook as gb:
                 gb.remove_submission(lesson_name, user_id)
                 logger.debug(f'Submission of user "{user_id}" for lesson '
                              f'"{lesson_name}" was removed from the database.')
-            path_ = os.path.join(ROOT_PATH, 'submitted', user_id, lesson_name)
+            path_ = os.path.join(SUBMITTED_ROOT, user_id, lesson_name)
             if os.path.exists(path_):
-                shutil.rmtree(path_)
+                self._rmtree_async(path_)
                 logger.debug(f'Submitted directory "{path_}" was cleared.')
             return False
         logger.info(f'Submission of user "{user_id}" for '
@@ -196,13 +551,13 @@ class Grader:
         logger.debug(f'Start generating nbgrader feedback of user '
                      f'{user_id} with lesson {lesson_name}.')
         status = self._nb_grader.generate_feedback(lesson_name, user_id)
-        logs = re.sub(r'\[\w+\] ', '', status['log']).replace('\n', '. ')
+        logs = clean_log(status['log'])
         if not status['success']:
             logger.error(f'Grader output: {logs}')
             raise RuntimeError(f'Generating nbgrader feedback of user '
                                f'{user_id} with lesson {lesson_name} failed.')
         logger.debug(f'Grader output: {logs}')
-        fb_path = os.path.join(ROOT_PATH, 'feedback', user_id, lesson_name,
+        fb_path = os.path.join(FEEDBACK_ROOT, user_id, lesson_name,
                                f'{lesson_name}.html')
         logger.info(f'Nbgrader feedback of user "{user_id}" with lesson '
                     f'"{lesson_name}" was generated and saved to "{fb_path}".')
@@ -218,27 +573,52 @@ class Grader:
         :param lesson_name: name of lesson.
         :return: True if notebook is valid, False otherwise.
         """
-        nb_cells = []
+        true_cells = self._get_source_cells(lesson_name)
+        nb_cells = set()
         try:
-            # Get all cells
-            with open(path, 'r', encoding='utf-8') as file:
-                all_cells = json.load(file).get('cells', [])
-
-            # Get only nbgrader cells
-            for cell in all_cells:
-                if 'nbgrader' in cell['metadata'].keys():
-                    nb_cells.append(
-                        cell['metadata']['nbgrader'].get('grade_id'))
-        except (JSONDecodeError, UnicodeDecodeError):
+            # Stream only cell metadata, outputs may be large
+            with open(path, 'rb') as file:
+                for metadata in ijson.items(file, 'cells.item.metadata',
+                                            use_float=True):
+                    if 'nbgrader' not in metadata:
+                        continue
+                    grade_id = metadata['nbgrader'].get('grade_id')
+
+                    # Unknown or repeated cell, no need to read further
+                    if grade_id not in true_cells or grade_id in nb_cells:
+                        return False
+                    nb_cells.add(grade_id)
+        except (ijson.JSONError, UnicodeDecodeError):
             logger.debug(f'File "{path}" does not have a json structure.')
             return False
+        return nb_cells == true_cells
+
+    def _get_source_cells(self, lesson_name: str) -> FrozenSet[str]:
+        """Get names of nbgrader cells of original assignment.
 
-        # Get valid cells
-        with self._nb_grader.gradebook as gb:
+        Names of each lesson are cached for `INFO_CACHE_TTL` seconds,
+        until its source notebook is modified or `invalidate_caches`
+        is called.
+
+        :param lesson_name: name of lesson.
+        :return: cell names, they are unique within a notebook.
+        """
+        path_notebook = os.path.join(SOURCE_ROOT, lesson_name,
+                                     f'{lesson_name}.ipynb')
+        mtime_ns = os.stat(path_notebook).st_mtime_ns
+        now = time.monotonic()
+        cached = self._source_cells.get(lesson_name)
+        if cached is not None and cached[0] == mtime_ns and now < cached[1]:
+            return cached[2]
+
+        with self._gradebook as gb:
             origin_cells = gb.find_notebook(lesson_name, lesson_name) \
                 .source_cells
-        true_cells = [cell.name for cell in origin_cells]
-        return Counter(nb_cells) == Counter(true_cells)
+            true_cells = frozenset(cell.name for cell in origin_cells)
+        self._source_cells[lesson_name] = (mtime_ns, now + INFO_CACHE_TTL,
+                                           true_cells)
+        logger.debug(f'Cells of lesson "{lesson_name}" were loaded.')
+        return true_cells
 
     def _is_submission_newer(self, submitted_path: str,
                              timestamp: datetime) -> bool:
@@ -250,18 +630,18 @@ class Grader:
         """
         path_timestamp = os.path.join(submitted_path, 'timestamp.txt')
 
-        # If there is no such path, the submission is the first
-        if not os.path.exists(path_timestamp):
+        # Read the old timestamp and compare with the new one
+        try:
+            with open(path_timestamp, 'r') as file:
+                time_old = file.readline().strip()
+        except FileNotFoundError:
+            # If there is no such path, the submission is the first
             logger.debug('It is the first submission of the user for this '
                          'lesson.')
             return True
+        logger.debug(f'The previous submission was made "{time_old}".')
 
-        # Read the old timestamp and compare with the new one
-        with open(path_timestamp, 'r') as file:
-            time_old = file.readline().strip()
-            logger.debug(f'The previous submission was made "{time_old}".')
-        time_old = parser.parse(time_old)
-        return timestamp > time_old
+        return timestamp > parse_timestamp(time_old)
 
     def _get_submission_grades(self, lesson_name: str,
                                user_id: str) -> List[Task]:
@@ -271,16 +651,31 @@ class Grader:
         :param user_id: user id.
         :return: grades per each task.
         """
-        # Get grades
-        grades = {}
-        with self._nb_grader.gradebook as gb:
-            assignment = gb.find_submission(lesson_name, user_id)
-            submission = assignment.notebooks[0]
-            for grade in submission.grades:
-                grades[grade.name] = (grade.score, grade.max_score)
+        from nbgrader.api import (Assignment, BaseCell, Grade,
+                                  SubmittedAssignment, SubmittedNotebook)
 
         # Get tasks description
         tasks = self._get_lesson_tasks(lesson_name)
+
+        # Get grades of the test cells with one query, without loading
+        # submission objects and deferred columns of each grade
+        with self._gradebook as gb:
+            query = gb.db.query(BaseCell.name, Grade.score, Grade.max_score) \
+                .select_from(Grade) \
+                .join(BaseCell, Grade.cell_id == BaseCell.id) \
+                .join(SubmittedNotebook,
+                      Grade.notebook_id == SubmittedNotebook.id) \
+                .join(SubmittedAssignment,
+                      SubmittedNotebook.assignment_id
+                      == SubmittedAssignment.id) \
+                .join(Assignment,
+                      SubmittedAssignment.assignment_id == Assignment.id)
+            rows = query.filter(
+                Assignment.name == lesson_name,
+                Assignment.course_id == gb.course_id,
+                SubmittedAssignment.student_id == user_id,
+                BaseCell.name.in_([task.test_cell for task in tasks])).all()
+        grades = {name: (score, max_score) for name, score, max_score in rows}
         for task in tasks:
             task.score, task.max_score = grades[task.test_cell]
         logger.debug(f'Grades of user "{user_id}" for lesson "{lesson_name}" '
@@ -295,51 +690,57 @@ class Grader:
         :param lesson_name: name of lesson.
         :return: tasks in the right order.
         """
-        # Load original assignment
         path_notebook = os.path.join('source', lesson_name,
                                      f'{lesson_name}.ipynb')
-        with open(path_notebook, 'r', encoding='utf-8') as file:
-            notebook = json.load(file)
-
-        # Extract grade names
-        pat = re.compile(TASK_NAME_PATTERN)
-        tasks = []
-        task = None
-        for cell in notebook['cells']:
-            nb_data = cell['metadata'].get('nbgrader')
-            if nb_data:
-                # If it is a task name cell
-                if cell['cell_type'] == 'markdown':
-                    is_todo = re.match(pat, cell['source'][0])
-                    if is_todo:
-                        task = Task(name=is_todo.group('name'))
-                    continue
-
-                # If it is a test cell
-                if cell['cell_type'] == 'code':
-                    if nb_data['grade']:
-                        task.test_cell = nb_data['grade_id']
-                        tasks.append(task)
-        logger.debug(f'Task names were extracted for lesson "{lesson_name}".')
-        return tasks
+        tasks = load_lesson_tasks(path_notebook,
+                                  os.stat(path_notebook).st_mtime_ns)
+
+        # Scores are set to the tasks, so keep the cached ones untouched
+        return [replace(task) for task in tasks]
+
+    def invalidate_caches(self) -> None:
+        """Drop cached assignment data when lessons are modified."""
+        self._source_cells.clear()
+        self._db.invalidate_caches()
+        logger.debug('Cached assignment cells were dropped.')
 
     def stop(self) -> None:
         """Stop grading."""
+        self._pool.shutdown(wait=True)
+        self._rm_pool.shutdown(wait=True)
+        self._gradebook.dispose()
         self._db.stop_db_connection()
         logger.debug('Grader was stopped.')
 
+    def _open_gradebook(self) -> None:
+        """Open gradebook, nbgrader checks its schema at this moment."""
+        self._gradebook = PooledGradebook(
+            self._config.CourseDirectory.db_url,
+            self._config.CourseDirectory.course_id)
+        logger.debug('Standard nbgrader schema was checked.')
+
     def _check_schema(self) -> None:
-        """Check if all the necessary tables exist."""
-
-        # Standard nbgrader schema
-        with self._nb_grader.gradebook as gb:
-            course_id = self._config.CourseDirectory.course_id
-            gb.check_course(course_id)
-            logger.debug('Standard nbgrader schema was checked.')
-
-        # Customizations
-        alembic_cfg = alembic.config.Config()
-        alembic_cfg.set_main_option(
-            'script_location', os.path.join(ROOT_PATH, 'alembic'))
-        alembic.command.upgrade(alembic_cfg, 'head')
-        self._db.refresh_metadata()
+        """Check if all the necessary tables exist.
+
+        Migrations are applied once per process for each database.
+        """
+        db_url = self._config.CourseDirectory.db_url
+        if db_url in SCHEMA_CHECKED:
+            logger.debug('Custom schema was already checked.')
+            return
+
+        # Customizations, upgrade only if the database is behind the head
+        from alembic.runtime.migration import MigrationContext
+        alembic_cfg, scripts = get_alembic_scripts()
+        with self._gradebook.engine.connect() as connection:
+            context = MigrationContext.from_connection(connection)
+            current = context.get_current_revision()
+        head = scripts.get_current_head()
+        if current != head:
+            import alembic.command
+            alembic.command.upgrade(alembic_cfg, 'head')
+            self._db.refresh_metadata()
+            self.invalidate_caches()
+            logger.debug(f'Custom schema was upgraded from "{current}" '
+                         f'to "{head}".')
+        SCHEMA_CHECKED.add(db_url)
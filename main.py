@@ -1,10 +1,11 @@
-import json
 import os
 import traceback
+from concurrent.futures import as_completed
 from datetime import datetime
 from datetime import timezone
 from typing import Dict
 
+import orjson
 from dotenv import load_dotenv
 
 from definitions import DATE_FORMAT
@@ -28,10 +29,10 @@ def sync_release_folder(gdrive_publisher: GDrivePublisher) -> None:
     :param gdrive_publisher: publisher instance.
     """
     release_path = os.path.join(ROOT_PATH, 'release')
-    if not os.path.exists(release_path):
-        os.makedirs(release_path)
-    for lesson in os.listdir(release_path):
-        gdrive_publisher.sync(os.path.join(release_path, lesson), 'release')
+    os.makedirs(release_path, exist_ok=True)
+    with os.scandir(release_path) as entries:
+        lessons = [entry.path for entry in entries if entry.is_dir()]
+    gdrive_publisher.sync_many(lessons, 'release')
     logger.info('Local release versions of assignments '
                 'were synchronized with the cloud ones.')
 
@@ -43,12 +44,12 @@ def sync_html_sources(gdrive_publisher: GDrivePublisher) -> Dict[str, str]:
     :return: filenames and their links.
     """
     pic_path = os.path.join(ROOT_PATH, 'exchanger', 'resources', 'pics')
-    links = {}
-    for pic in os.listdir(pic_path):
-        image_name = os.path.splitext(pic)[0]
-        link = gdrive_publisher.sync(os.path.join(pic_path, pic),
-                                     'html_sources', 'const_thumbnail')
-        links[image_name] = link
+    with os.scandir(pic_path) as entries:
+        pics = [entry for entry in entries if entry.is_file()]
+    pic_links = gdrive_publisher.sync_many(
+        [pic.path for pic in pics], 'html_sources', 'const_thumbnail')
+    links = {os.path.splitext(pic.name)[0]: link
+             for pic, link in zip(pics, pic_links)}
     logger.info('Local html sources were synchronized with the cloud ones.')
     return links
 
@@ -57,7 +58,7 @@ if __name__ == '__main__':
 
     # To fetch submissions and send feedbacks
     exchanger = GmailExchanger(
-        creds=json.loads(os.environ['GMAIL_CREDS']),
+        creds=orjson.loads(os.environ['GMAIL_CREDS']),
         fetch_label=os.environ['GMAIL_FETCH_LABEL'],
         send_name=os.environ['GMAIL_SEND_NAME'],
         send_email=os.environ['GMAIL_SEND_EMAIL'],
@@ -68,7 +69,7 @@ if __name__ == '__main__':
 
     # To publish release version of assignments
     publisher = GDrivePublisher(
-        creds=json.loads(os.environ['GDRIVE_CREDS']),
+        creds=orjson.loads(os.environ['GDRIVE_CREDS']),
         cloud_root_name=os.environ['GDRIVE_PUBLISH_FOLDER'])
 
     try:
@@ -94,21 +95,35 @@ if __name__ == '__main__':
             # New submissions will be saved in downloads directory
             new_submissions = exchanger.fetch_new_submissions()
 
-            # Grade all new submissions
-            for submission in new_submissions:
+            # Grade all new submissions, feedbacks are kept with the ids of
+            # their submissions
+            feedbacks = []
+            feedback_ids = []
+            completed = []
+            try:
+                # Check parameters of the submissions and grade them
+                futures = {grader.submit_submission(submission): submission
+                           for submission in new_submissions}
+                for future in as_completed(futures):
+                    submission = futures[future]
+                    grade_result = future.result()
 
-                # Check parameters of the submission and grade it
-                grade_result = grader.grade_submission(submission)
-
-                if grade_result.status is not GradeStatus.SKIPPED:
                     # Create feedback
-                    feedback = feedback_maker.get_feedback(grade_result)
-
-                    # Send feedback
-                    exchanger.send_feedback(feedback)
-
-                # Mark submission as graded
-                exchanger.mark_as_completed(submission.exchange_id)
+                    if grade_result.status is not GradeStatus.SKIPPED:
+                        feedbacks.append(
+                            feedback_maker.get_feedback(grade_result))
+                        feedback_ids.append(submission.exchange_id)
+                    completed.append(submission.exchange_id)
+            finally:
+                # Send feedbacks and mark graded submissions as completed,
+                # those whose feedback was not sent stay unread for retry
+                if feedbacks:
+                    failed = {feedback_ids[position] for position
+                              in exchanger.send_feedback_bulk(feedbacks)}
+                    completed = [exchange_id for exchange_id in completed
+                                 if exchange_id not in failed]
+                if completed:
+                    exchanger.mark_many_as_completed(completed)
     except (KeyboardInterrupt, SystemExit):
         pass
     except:
@@ -19,8 +19,7 @@ except NameError:
 
 # Logging settings
 log_path = os.path.join(ROOT_PATH, 'logs')
-if not os.path.exists(log_path):
-    os.makedirs(log_path)
+os.makedirs(log_path, exist_ok=True)
 config.Application.log_level = 'INFO'
 config.Application.log_datefmt = DATE_FORMAT
 config.Application.log_format = LOG_FORMAT_INFO
@@ -1,12 +1,20 @@
-import glob
+import functools
 import hashlib
 import os
 import shutil
+import threading
+from concurrent.futures import Future
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import wait
 from typing import Any
 from typing import Dict
 from typing import Iterable
+from typing import Iterator
 from typing import List
+from typing import Optional
 
+import pathspec
+from cachetools import TTLCache
 from google.oauth2 import service_account
 from googleapiclient.discovery import build
 from googleapiclient.http import MediaFileUpload
@@ -15,32 +23,109 @@ from utils.app_logger import get_logger
 
 logger = get_logger(__name__)
 
+# Number of local files or folders that are synced in parallel
+SYNC_WORKERS = 16
+
+# Number of files of a folder that are uploaded in parallel
+UPLOAD_WORKERS = 8
+
+# Attributes of cloud files that are loaded with the content of a folder
+CHILD_ATTRIBUTES = ('id', 'name', 'mimeType', 'size', 'md5Checksum')
+
+# Folder listings are kept for this number of seconds since the cloud
+# folders can be changed by others
+LISTING_CACHE_TTL = 60
+LISTING_CACHE_SIZE = 4096
+
+# Maximum number of files in one page of a listing
+LIST_PAGE_SIZE = 1000
+
+# Larger files are uploaded with resumable sessions in chunks, smaller
+# ones with one multipart request
+RESUMABLE_MIN_SIZE = 5 << 20
+UPLOAD_CHUNK_SIZE = 8 << 20
+
+# Size of chunks in which local files are read for hashing
+HASH_BUFSIZE = 1 << 20
+
+
+def escape_query_value(value: str) -> str:
+    """Escape string to put it into quotes of GDrive search query.
+
+    :param value: string value.
+    :return: escaped value.
+    """
+    return value.replace('\\', '\\\\').replace("'", "\\'")
+
+
+@functools.lru_cache(maxsize=None)
+def load_ignore_spec() -> pathspec.PathSpec:
+    """Load patterns of files to ignore when publishing.
+
+    Patterns follow the rules of `.gitignore` and are loaded once.
+
+    :return: compiled patterns.
+    """
+    path = os.path.join(os.path.dirname(__file__), '.publishignore')
+    with open(path, 'r') as file:
+        spec = pathspec.PathSpec.from_lines('gitwildmatch', file)
+    logger.debug('Publish ignore files were loaded.')
+    return spec
+
 
 class GDrivePublisher:
     """Use Google Drive API to publish files."""
 
-    def __init__(self, creds: Dict[str, Any], cloud_root_name: str) -> None:
+    def __init__(self, creds: Dict[str, Any], cloud_root_name: str,
+                 upload_workers: int = UPLOAD_WORKERS) -> None:
         """Create GDrive publisher.
 
         :param creds: Google Drive credentials.
         :param cloud_root_name: name of root folder where to publish.
+        :param upload_workers: number of files of a folder that are
+        uploaded in parallel.
         """
         self.cloud_root_name = cloud_root_name
         self._creds = creds
         self._scopes = ['https://www.googleapis.com/auth/drive']
-        self._ignore_files = self._get_ignore_files()
-        self._gdrive = None
+        self._credentials = None
+        self._ignore_spec = load_ignore_spec()
+        self._local = threading.local()
+        self._path_lock = threading.Lock()
+        self._upload_pool = ThreadPoolExecutor(max_workers=upload_workers)
+        self._children_lock = threading.Lock()
+        self._children_cache = TTLCache(maxsize=LISTING_CACHE_SIZE,
+                                        ttl=LISTING_CACHE_TTL)
+        self._children_versions = {}
         self._cloud_root_id = None
 
+    @property
+    def _gdrive(self) -> Any:
+        """Get GDrive resource of the current thread.
+
+        The HTTP connection of a resource is not thread-safe, so each thread
+        builds its own one.
+
+        :return: resource for interaction.
+        """
+        resource = getattr(self._local, 'gdrive', None)
+        if resource is None:
+            resource = self._build_resource()
+            self._local.gdrive = resource
+        return resource
+
     def connect(self) -> None:
         """Find root cloud folder and build GDrive resource."""
 
-        # Build resource
-        self._gdrive = self._build_resource()
+        # Build resource, all threads share the credentials and their token
+        self._credentials = \
+            service_account.Credentials.from_service_account_info(
+                self._creds, scopes=self._scopes)
+        self._local.gdrive = self._build_resource()
 
         # Get id of cloud folder
         query = f"mimeType = 'application/vnd.google-apps.folder' " \
-                f"and name = '{self.cloud_root_name}' " \
+                f"and name = '{escape_query_value(self.cloud_root_name)}' " \
                 f"and trashed != True"
         cloud_file_id = self._find_cloud_files(query, attributes=['id'])
         if not cloud_file_id:
@@ -58,16 +143,73 @@ class GDrivePublisher:
         parent_id = self._cloud_root_id
         if cloud_path == '.':
             return parent_id
-        for name in cloud_path.split(os.sep):
-            query = f"name = '{name}' and '{parent_id}' in parents " \
-                    f"and trashed != True"
-            folder = self._find_cloud_files(query, ['id'])
-            if not folder:
-                parent_id = self._create_cloud_folder(name, parent_id)
-            else:
-                parent_id = folder[0]['id']
+
+        # Parallel syncs must not create the same folder twice
+        with self._path_lock:
+            for name in cloud_path.split(os.sep):
+                folder = self._list_children(parent_id).get(name)
+                if not folder:
+                    parent_id = self._create_cloud_folder(name, parent_id)
+                else:
+                    parent_id = folder['id']
         return parent_id
 
+    def _list_children(self, folder_id: str) -> Dict[str, Dict[str, Any]]:
+        """Get content of cloud folder with one listing.
+
+        Listings are cached for `LISTING_CACHE_TTL` seconds or until the
+        publisher changes the folder.
+
+        :param folder_id: id of folder.
+        :return: attributes of files and folders by their names.
+        """
+        with self._children_lock:
+            children = self._children_cache.get(folder_id)
+            version = self._children_versions.get(folder_id, 0)
+        if children is not None:
+            return children
+
+        query = f"'{folder_id}' in parents and trashed != True"
+        children = {}
+        for file in self._iter_cloud_files(query, CHILD_ATTRIBUTES):
+            children.setdefault(file['name'], file)
+
+        # The listing is outdated if the folder was changed meanwhile
+        with self._children_lock:
+            if self._children_versions.get(folder_id, 0) == version:
+                self._children_cache[folder_id] = children
+        return children
+
+    def _invalidate_children(self, folder_id: str) -> None:
+        """Drop cached content of cloud folder after changing it.
+
+        :param folder_id: id of folder.
+        """
+        with self._children_lock:
+            self._children_cache.pop(folder_id, None)
+            self._children_versions[folder_id] = \
+                self._children_versions.get(folder_id, 0) + 1
+
+    def sync_many(self, local_files: Iterable[str],
+                  cloud_folder_path: str = '.',
+                  link_type: str = 'webViewLink',
+                  to_share: bool = True) -> List[str]:
+        """Sync several local files or folders with the cloud ones in parallel.
+
+        :param local_files: paths to local files or folders.
+        :param cloud_folder_path: path to a folder where to upload content
+        of the local files, the same as in `sync`.
+        :param link_type: type of links to return.
+        :param to_share: to share files to anyone with link for read-only
+        access.
+        :return: links to the files in the order of the local ones.
+        """
+        with ThreadPoolExecutor(max_workers=SYNC_WORKERS) as pool:
+            return list(pool.map(
+                lambda local_file: self.sync(local_file, cloud_folder_path,
+                                             link_type, to_share),
+                local_files))
+
     def sync(self, local_file: str, cloud_folder_path: str = '.',
              link_type: str = 'webViewLink', to_share: bool = True) -> str:
         """Sync a local file or folder with the cloud one.
@@ -95,76 +237,139 @@ class GDrivePublisher:
         parent_id = self._create_cloud_path(cloud_folder_path)
 
         # Find the file and sync it
-        query = f"name = '{local_name}' and '{parent_id}' in parents " \
-                f"and trashed != True"
-        cloud_file = self._find_cloud_files(query, ['id'])
+        cloud_file = self._list_children(parent_id).get(local_name)
         if not cloud_file:
-            logger.debug(f'File or folder "{local_name}" does not exist '
-                         f'in the cloud path "{cloud_folder_path}".')
+            logger.debug('File or folder "%s" does not exist '
+                         'in the cloud path "%s".',
+                         local_name, cloud_folder_path)
             cloud_file_id = self._upload_file(local_file, parent_id)
         else:
-            cloud_file_id = cloud_file[0]['id']
-            logger.debug(f'File or folder "{local_name}" exists '
-                         f'in the cloud path "{cloud_folder_path}".')
-            self._update_cloud_file(cloud_file_id, local_file)
-        logger.debug(f'Content of the local object "{local_file}" was '
-                     f'synchronized with the cloud file "{cloud_name}".')
-
-        # Share
+            cloud_file_id = cloud_file['id']
+            logger.debug('File or folder "%s" exists in the cloud path "%s".',
+                         local_name, cloud_folder_path)
+            self._update_cloud_file(cloud_file, local_file, parent_id)
+        logger.debug('Content of the local object "%s" was synchronized '
+                     'with the cloud file "%s".', local_file, cloud_name)
+
+        # Share, only the needed attributes are requested and the thumbnail
+        # link is built from the id
+        attributes = []
+        if to_share:
+            attributes.append('permissions(id,role)')
+        if link_type != 'const_thumbnail':
+            attributes.append(link_type)
+        file_params = {}
+        if attributes:
+            file_params = self._get_cloud_file(cloud_file_id, attributes)
         if link_type == 'const_thumbnail':
-            file_params = self._get_cloud_file(
-                cloud_file_id, ['permissions', 'name'])
             file_params[link_type] = f'http://drive.google.com/' \
                                      f'thumbnail?id={cloud_file_id}'
-        else:
-            file_params = self._get_cloud_file(
-                cloud_file_id, ['permissions', link_type, 'name'])
         if to_share:
-            is_shared = False
-            for p in file_params['permissions']:
-                if (p['id'] == 'anyoneWithLink') and (p['role'] == 'reader'):
-                    is_shared = True
+            is_shared = any(
+                p['id'] == 'anyoneWithLink' and p['role'] == 'reader'
+                for p in file_params['permissions'])
             if is_shared:
-                logger.debug(f'File or folder "{file_params["name"]}" with '
-                             f'id "{cloud_file_id}" is already shared.')
+                logger.debug('File or folder "%s" with id "%s" is already '
+                             'shared.', local_name, cloud_file_id)
             else:
                 self._share_cloud_file(cloud_file_id)
-                logger.debug(f'File or folder "{file_params["name"]}" with '
-                             f'id "{cloud_file_id}" was shared with link '
-                             f'to anyone for reading.')
+                logger.debug('File or folder "%s" with id "%s" was shared '
+                             'with link to anyone for reading.',
+                             local_name, cloud_file_id)
         return file_params[link_type]
 
-    def _update_cloud_file(self, file_id: str, path_local_file: str) -> None:
+    def _update_cloud_file(self, cloud_file: Dict[str, Any],
+                           path_local_file: str, parent_id: str) -> None:
         """Change cloud file content.
 
-        :param file_id: id of file.
+        :param cloud_file: attributes of file from the listing of its folder.
         :param path_local_file: path to local file or folder.
+        :param parent_id: id of the cloud folder of the file.
         """
-        # If file
+        file_id = cloud_file['id']
+
+        # If file, the listing can be outdated, so fresh attributes
+        # are compared
         if not os.path.isdir(path_local_file):
-            c_file = self._get_cloud_file(file_id, ['id', 'md5Checksum'])
-            if c_file['md5Checksum'] != self._get_md5_hash(path_local_file):
-                media = MediaFileUpload(path_local_file, resumable=True)
-                self._gdrive.files().update(fileId=file_id,
-                                            media_body=media).execute()
-                logger.debug(f'File "{file_id}" was updated '
-                             f'with content from "{path_local_file}"')
-
-        # If directory
+            fresh_file = self._get_cloud_file(file_id, ('size', 'md5Checksum'))
+            if self._is_file_changed(fresh_file, path_local_file):
+                self._update_file_content(file_id, path_local_file, parent_id)
+
+        # If directory, local files are hashed while the cloud folder
+        # is listed again since the cached listing can be outdated
         else:
-            query = f"'{file_id}' in parents and trashed != True"
-            cloud_content = self._find_cloud_files(query, ['id', 'name'])
-            cloud_content = {f['name']: f for f in cloud_content}
-            cloud_names = set(cloud_content.keys())
             local_content = self._get_local_content(path_local_file)
             local_names = set(local_content.keys())
+            self._invalidate_children(file_id)
+            cloud_content = self._list_children(file_id)
+            cloud_names = set(cloud_content.keys())
+
+            # Requests for files are sent by the upload pool in parallel,
+            # subfolders are walked in this thread
+            requests = []
             for common in cloud_names.intersection(local_names):
-                self._update_cloud_file(cloud_content[common]['id'],
-                                        local_content[common]['path'])
+                path = local_content[common]['path']
+                if local_content[common]['is_dir']:
+                    self._update_cloud_file(cloud_content[common], path,
+                                            file_id)
+                elif self._is_file_changed(
+                        cloud_content[common], path,
+                        local_content[common]['md5hash']):
+                    requests.append(self._upload_pool.submit(
+                        self._update_file_content,
+                        cloud_content[common]['id'], path, file_id))
             for cloud_drop in cloud_names.difference(local_names):
-                self._remove_cloud_file(cloud_content[cloud_drop]['id'])
+                requests.append(self._upload_pool.submit(
+                    self._remove_cloud_file, cloud_content[cloud_drop]['id'],
+                    file_id))
             for cloud_add in local_names.difference(cloud_names):
-                self._upload_file(local_content[cloud_add]['path'], file_id)
+                path = local_content[cloud_add]['path']
+                if local_content[cloud_add]['is_dir']:
+                    self._upload_file(path, file_id)
+                else:
+                    requests.append(self._upload_pool.submit(
+                        self._upload_single_file, path, file_id))
+            wait(requests)
+            for request in requests:
+                request.result()
+
+    def _is_file_changed(self, cloud_file: Dict[str, Any],
+                         path_local_file: str,
+                         local_hash: Optional[Future] = None) -> bool:
+        """Compare local file with the cloud one.
+
+        :param cloud_file: size and md5 checksum of the cloud file.
+        :param path_local_file: path to local file.
+        :param local_hash: scheduled md5 hash of the local file if any.
+        :return: True if the content differs.
+        """
+        # Files of different sizes differ without hashing
+        cloud_size = cloud_file.get('size')
+        if cloud_size is not None \
+                and int(cloud_size) != os.path.getsize(path_local_file):
+            if local_hash is not None:
+                local_hash.cancel()
+            return True
+        if local_hash is None:
+            local_hash = self._get_md5_hash(path_local_file)
+        else:
+            local_hash = local_hash.result()
+        return cloud_file.get('md5Checksum') != local_hash
+
+    def _update_file_content(self, file_id: str, path_local_file: str,
+                             parent_id: str) -> None:
+        """Replace content of cloud file with the local one.
+
+        :param file_id: id of file.
+        :param path_local_file: path to local file.
+        :param parent_id: id of the cloud folder of the file.
+        """
+        media = self._get_media(path_local_file)
+        self._gdrive.files().update(fileId=file_id, fields='id',
+                                    media_body=media).execute()
+        self._invalidate_children(parent_id)
+        logger.debug('File "%s" was updated with content from "%s"',
+                     file_id, path_local_file)
 
     def _share_cloud_file(self, file_id: str) -> None:
         """Share file to anyone with a link.
@@ -173,9 +378,9 @@ class GDrivePublisher:
         """
         permissions = {'type': 'anyone', 'role': 'reader'}
         self._gdrive.permissions() \
-            .create(fileId=file_id, body=permissions).execute()
-        logger.debug(f'Permissions of file with id "{file_id}" '
-                     f'was modified to "{permissions}".')
+            .create(fileId=file_id, body=permissions, fields='id').execute()
+        logger.debug('Permissions of file with id "%s" was modified '
+                     'to "%s".', file_id, permissions)
 
     def _upload_file(self, path_local_file: str, parent_id: str) -> str:
         """Upload local file or folder to Google Drive.
@@ -184,39 +389,90 @@ class GDrivePublisher:
         :param parent_id: id of the cloud folder where to upload.
         :return file id.
         """
-        # If it is a folder
+        # If it is a folder, its files are uploaded in parallel
         if os.path.isdir(path_local_file):
-            dir_name = os.path.basename(path_local_file)
-            folder_id = self._create_cloud_folder(dir_name, parent_id)
-            for obj_name in os.listdir(path_local_file):
-                path = os.path.join(path_local_file, obj_name)
-                self._upload_file(path, folder_id)
-            logger.debug(f'Folder "{path_local_file}" was uploaded '
-                         f'to the cloud folder with id "{parent_id}".')
+            uploads = []
+            folder_id = self._upload_folder(path_local_file, parent_id,
+                                            uploads)
+            wait(uploads)
+            for upload in uploads:
+                upload.result()
+            logger.debug('Folder "%s" was uploaded to the cloud folder '
+                         'with id "%s".', path_local_file, parent_id)
             return folder_id
 
         # If it is a file
+        return self._upload_single_file(path_local_file, parent_id)
+
+    def _upload_folder(self, path_local_folder: str, parent_id: str,
+                       uploads: List[Future]) -> str:
+        """Create cloud folders of the local tree and schedule its files.
+
+        Folders are created in the calling thread since their ids are
+        needed for the content, files are uploaded by the upload pool.
+
+        :param path_local_folder: path to local folder.
+        :param parent_id: id of the cloud folder where to upload.
+        :param uploads: list to add scheduled uploads of files to.
+        :return: folder id.
+        """
+        dir_name = os.path.basename(path_local_folder)
+        folder_id = self._create_cloud_folder(dir_name, parent_id)
+        with os.scandir(path_local_folder) as entries:
+            for entry in entries:
+                if entry.is_dir():
+                    self._upload_folder(entry.path, folder_id, uploads)
+                else:
+                    uploads.append(self._upload_pool.submit(
+                        self._upload_single_file, entry.path, folder_id))
+        return folder_id
+
+    def _upload_single_file(self, path_local_file: str,
+                            parent_id: str) -> str:
+        """Upload local file to Google Drive.
+
+        :param path_local_file: path to local file.
+        :param parent_id: id of the cloud folder where to upload.
+        :return file id.
+        """
         obj_name = os.path.split(path_local_file)[-1]
         file_metadata = {'name': obj_name, 'parents': [parent_id]}
-        media = MediaFileUpload(path_local_file, resumable=True)
+        media = self._get_media(path_local_file)
         file = self._gdrive.files().create(
             body=file_metadata, fields='id', media_body=media).execute()
-        logger.debug(f'File "{path_local_file}" was uploaded to the cloud '
-                     f'folder with id "{parent_id}".')
+        self._invalidate_children(parent_id)
+        logger.debug('File "%s" was uploaded to the cloud folder '
+                     'with id "%s".', path_local_file, parent_id)
         return file['id']
 
+    @staticmethod
+    def _get_media(path_local_file: str) -> MediaFileUpload:
+        """Prepare content of local file for uploading.
+
+        :param path_local_file: path to local file.
+        :return: media to upload.
+        """
+        is_large = os.path.getsize(path_local_file) > RESUMABLE_MIN_SIZE
+        return MediaFileUpload(path_local_file, resumable=is_large,
+                               chunksize=UPLOAD_CHUNK_SIZE)
+
     def _get_local_content(self, path_folder) -> Dict[str, Any]:
         """Get content of local folder.
 
+        Hashes of files are computed by the upload pool in background.
+
         :param path_folder: path to local folder.
-        :return: names and hash of files and folders.
+        :return: names, paths, types, and scheduled hashes of files
+        and folders.
         """
         result = {}
-        for file in os.listdir(path_folder):
-            path = os.path.join(path_folder, file)
-            result[file] = {'path': path}
-            if not os.path.isdir(path):
-                result[file]['md5hash'] = self._get_md5_hash(path)
+        with os.scandir(path_folder) as entries:
+            for entry in entries:
+                is_dir = entry.is_dir()
+                result[entry.name] = {'path': entry.path, 'is_dir': is_dir}
+                if not is_dir:
+                    result[entry.name]['md5hash'] = self._upload_pool.submit(
+                        self._get_md5_hash, entry.path)
         return result
 
     def _sanitize_local_folder(self, path: str) -> None:
@@ -224,21 +480,28 @@ class GDrivePublisher:
 
         :param path: path of folder to clean.
         """
-        for pattern in self._ignore_files:
-            path_ = os.path.join(path, pattern)
-            to_drop = glob.glob(path_, recursive=True)
-            for file in to_drop:
-                shutil.rmtree(file)
-                logger.debug(f'File "{file}" was sanitized.')
+        for root, dirs, files in os.walk(path):
+            rel_root = os.path.relpath(root, path)
+            prefix = '' if rel_root == os.curdir else f'{rel_root}/'
+
+            # Dropped folders are not walked into
+            for name in list(dirs):
+                if self._ignore_spec.match_file(f'{prefix}{name}/'):
+                    dirs.remove(name)
+                    shutil.rmtree(os.path.join(root, name))
+                    logger.debug('Folder "%s%s" was sanitized.',
+                                 prefix, name)
+            for name in files:
+                if self._ignore_spec.match_file(f'{prefix}{name}'):
+                    os.remove(os.path.join(root, name))
+                    logger.debug('File "%s%s" was sanitized.', prefix, name)
 
     def _build_resource(self) -> Any:
         """Build Google Drive api resource.
 
         :return: resource for interaction.
         """
-        credentials = service_account.Credentials.from_service_account_info(
-            self._creds, scopes=self._scopes)
-        resource = build('drive', 'v3', credentials=credentials)
+        resource = build('drive', 'v3', credentials=self._credentials)
         logger.debug('New GDrive resource was created.')
         return resource
 
@@ -248,10 +511,20 @@ class GDrivePublisher:
         :param path_file: path to local file.
         :return: hash value.
         """
-        hasher = hashlib.md5()
-        with open(path_file, 'rb') as f:
-            for chunk in iter(lambda: f.read(4096), b""):
-                hasher.update(chunk)
+        with open(path_file, 'rb', buffering=0) as file:
+            # Since Python 3.11 the whole file is hashed in C
+            if hasattr(hashlib, 'file_digest'):
+                return hashlib.file_digest(file, 'md5').hexdigest()
+
+            # Large chunks are read into one reused buffer, hashing of each
+            # chunk releases the GIL
+            hasher = hashlib.md5()
+            buffer = bytearray(HASH_BUFSIZE)
+            view = memoryview(buffer)
+            size = file.readinto(buffer)
+            while size:
+                hasher.update(view[:size])
+                size = file.readinto(buffer)
         return hasher.hexdigest()
 
     def _create_cloud_folder(self, name: str, parent_id: str) -> str:
@@ -267,17 +540,25 @@ class GDrivePublisher:
             'parents': [parent_id]
         }
         file = self._gdrive.files().create(body=meta, fields='id').execute()
-        logger.debug(f'Cloud folder "{name}" was created '
-                     f'with id "{file["id"]}".')
+        self._invalidate_children(parent_id)
+
+        # The new folder is known to be empty
+        with self._children_lock:
+            self._children_cache[file['id']] = {}
+        logger.debug('Cloud folder "%s" was created with id "%s".',
+                     name, file['id'])
         return file['id']
 
-    def _remove_cloud_file(self, file_id: str) -> None:
+    def _remove_cloud_file(self, file_id: str, parent_id: str) -> None:
         """Remove file or folder from the cloud.
 
         :param file_id: id of file.
+        :param parent_id: id of the cloud folder of the file.
         """
         self._gdrive.files().delete(fileId=file_id).execute()
-        logger.debug(f'File or folder with id "{file_id}" was removed.')
+        self._invalidate_children(parent_id)
+        self._invalidate_children(file_id)
+        logger.debug('File or folder with id "%s" was removed.', file_id)
 
     def _find_cloud_files(self, query: str, attributes: Iterable[str]) \
             -> List[Dict[str, Any]]:
@@ -287,15 +568,28 @@ class GDrivePublisher:
         :param query: filter query.
         :return: list with attributes of each file in specified folder.
         """
+        return list(self._iter_cloud_files(query, attributes))
+
+    def _iter_cloud_files(self, query: str, attributes: Iterable[str]) \
+            -> Iterator[Dict[str, Any]]:
+        """Iterate over files attributes in accordance to the query.
+
+        Files are yielded page by page as they are loaded.
+
+        :param attributes: attributes to load.
+        :param query: filter query.
+        :return: attributes of each file in specified folder.
+        """
         fields = f'nextPageToken, files({", ".join(attributes)})'
-        results = self._gdrive.files().list(q=query, fields=fields).execute()
-        next_page_token = results.get('nextPageToken')
-        while next_page_token:
-            next_page = self._gdrive.files().list(
-                q=query, fields=fields, pageToken=next_page_token).execute()
-            next_page_token = next_page.get('nextPageToken')
-            results['files'] += next_page['files']
-        return results['files']
+        next_page_token = None
+        while True:
+            page = self._gdrive.files().list(
+                q=query, fields=fields, pageSize=LIST_PAGE_SIZE,
+                pageToken=next_page_token).execute()
+            yield from page['files']
+            next_page_token = page.get('nextPageToken')
+            if not next_page_token:
+                return
 
     def _get_cloud_file(self, file_id: str, attributes: Iterable[str]) \
             -> Dict[str, Any]:
@@ -309,17 +603,3 @@ class GDrivePublisher:
         results = self._gdrive.files().get(
             fileId=file_id, fields=fields).execute()
         return results
-
-    def _get_ignore_files(self) -> List[str]:
-        """Get file patterns to ignore when publishing.
-
-        :return: file patterns.
-        """
-        patterns = []
-        path = os.path.join(os.path.dirname(__file__), '.publishignore')
-        with open(path, 'r') as file:
-            for line in file.readlines():
-                if line.strip() and not line.startswith('#'):
-                    patterns.append(line)
-        logger.debug('Publish ignore files were loaded.')
-        return patterns
@@ -1,8 +1,8 @@
-import json
 import os
 import re
 from typing import Iterable, Union
 
+import orjson
 from dotenv import load_dotenv
 from nbgrader.apps import NbGraderAPI
 from traitlets.config import Config
@@ -57,7 +57,7 @@ if __name__ == '__main__':
 
     # Publisher
     publisher = GDrivePublisher(
-        creds=json.loads(os.environ['GDRIVE_CREDS']),
+        creds=orjson.loads(os.environ['GDRIVE_CREDS']),
         cloud_root_name=os.environ['GDRIVE_PUBLISH_FOLDER'])
     publisher.connect()
 